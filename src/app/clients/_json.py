@@ -0,0 +1,48 @@
+"""JSON encoding helpers shared by the API clients."""
+
+from typing import Any
+
+# orjson is a compiled JSON library that is several times faster than the
+# stdlib on the large entries/treatments payloads
+import orjson
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serialize an object to compact JSON bytes.
+
+    Args:
+        obj: JSON-serializable object
+
+    Returns:
+        UTF-8 encoded JSON document
+    """
+    return orjson.dumps(obj)
+
+
+def fragment(data: bytes) -> orjson.Fragment:
+    """
+    Wrap a serialized JSON document for embedding in dumps() output.
+
+    The bytes are copied into the output as they are, without decoding.
+
+    Args:
+        data: Complete JSON document
+
+    Returns:
+        Fragment that dumps() serializes to the given document
+    """
+    return orjson.Fragment(data)
+
+
+def loads(data: bytes | str) -> Any:
+    """
+    Deserialize a JSON document.
+
+    Args:
+        data: JSON document as bytes or str
+
+    Returns:
+        Deserialized Python object
+    """
+    return orjson.loads(data)
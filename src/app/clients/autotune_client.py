@@ -1,15 +1,183 @@
 """Client for running autotune analysis."""
 
-import json
 import logging
+import os
+import selectors
 import subprocess
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 
+from app.clients._json import dumps, loads
+
 logger = logging.getLogger(__name__)
 
 
+# Maximum number of bytes taken from a child process pipe per read() call
+_READ_SIZE = 1 << 16
+
+# RAM-backed tmpfs available on most Linux systems
+_SHM_DIR = Path("/dev/shm")
+
+
+def _detect_tmp_dir() -> str | None:
+    """
+    Pick the parent directory for autotune's temporary files.
+
+    The input files are short-lived and read straight back by autotune, so
+    they are kept on tmpfs when it is available to avoid disk I/O.
+
+    Returns:
+        Path to /dev/shm if it is a writable directory, otherwise None to
+        use the platform default temporary directory
+    """
+    if _SHM_DIR.is_dir() and os.access(_SHM_DIR, os.W_OK | os.X_OK):
+        return str(_SHM_DIR)
+    return None
+
+
+def _dump_bytes(path: Path, data: bytes) -> None:
+    """
+    Write bytes to a file using raw file descriptor writes.
+
+    Bypasses the buffered file object layer, which would only copy the
+    already complete payload into its buffer before writing it out.
+
+    Args:
+        path: Destination file, created with owner-only permissions
+        data: Content to write
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o600)
+    try:
+        view = memoryview(data)
+        # os.write may write less than requested, e.g. when interrupted
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+    finally:
+        os.close(fd)
+
+
+def _write_json(path: Path, data: Any) -> None:
+    """
+    Write data to a file as JSON.
+
+    Pre-serialized bytes are written unchanged, anything else is encoded
+    first.
+
+    Args:
+        path: Destination file
+        data: JSON-serializable object or JSON bytes
+    """
+    if not isinstance(data, bytes):
+        data = dumps(data)
+    _dump_bytes(path, data)
+
+
+def _log_line(line: bytes) -> None:
+    """
+    Forward one line of autotune output to the debug log.
+
+    Args:
+        line: Raw output line without the trailing newline
+    """
+    logger.debug("Autotune: %s", line.decode(errors="replace").rstrip())
+
+
+def _pump_output(process: subprocess.Popen, timeout: float) -> bytes:
+    """
+    Drain both pipes of a child process from a single selector loop.
+
+    Stdout and stderr are multiplexed with the platform's most efficient
+    selector (epoll on Linux), so neither pipe can fill up and block the
+    child, without a reader thread per pipe. Every complete line is
+    forwarded to the debug log.
+
+    Args:
+        process: Child started with stdout and stderr as unbuffered pipes
+        timeout: Maximum time in seconds to wait for both pipes to close
+
+    Returns:
+        Everything the child wrote to stderr
+
+    Raises:
+        subprocess.TimeoutExpired: If the pipes are still open after timeout
+    """
+    deadline = time.monotonic() + timeout
+    stderr_fd = process.stderr.fileno()
+    partial = {process.stdout.fileno(): b"", stderr_fd: b""}
+    stderr_chunks: list[bytes] = []
+    with selectors.DefaultSelector() as selector:
+        for fd in partial:
+            selector.register(fd, selectors.EVENT_READ)
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(process.args, timeout)
+            for key, _ in selector.select(remaining):
+                chunk = os.read(key.fd, _READ_SIZE)
+                if not chunk:
+                    # EOF: flush a final line that lacks a trailing newline
+                    selector.unregister(key.fd)
+                    if partial[key.fd]:
+                        _log_line(partial[key.fd])
+                    continue
+                if key.fd == stderr_fd:
+                    stderr_chunks.append(chunk)
+                *lines, partial[key.fd] = (partial[key.fd] + chunk).split(b"\n")
+                for line in lines:
+                    _log_line(line)
+    return b"".join(stderr_chunks)
+
+
+def _run_process(cmd: list[str], timeout: int) -> None:
+    """
+    Run a command and wait for it to finish.
+
+    Autotune can print megabytes of progress output, which is only useful
+    for debugging. Unless debug logging is enabled stdout is discarded;
+    otherwise it is streamed line by line to the log instead of being
+    buffered in memory. Stderr is always kept for error reporting.
+
+    Args:
+        cmd: Command and arguments
+        timeout: Maximum runtime in seconds
+
+    Raises:
+        subprocess.CalledProcessError: If the command exits non-zero
+        subprocess.TimeoutExpired: If the command exceeds the timeout
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        # With a single pipe, communicate() already waits in a selector loop
+        subprocess.run(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            check=True,
+            timeout=timeout,
+        )
+        return
+
+    started = time.monotonic()
+    with subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0
+    ) as process:
+        try:
+            stderr = _pump_output(process, timeout)
+            # The child has closed its pipes, so it is exiting; wait only
+            # for whatever is left of the timeout
+            elapsed = time.monotonic() - started
+            returncode = process.wait(timeout=max(timeout - elapsed, 0))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            raise
+
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr)
+
+
 class AutotuneClient:
     """
     Client for running autotune analysis.
@@ -26,22 +194,26 @@ class AutotuneClient:
             autotune_path: Path to oref0-autotune executable
         """
         self.autotune_path = autotune_path
+        self._tmp_dir = _detect_tmp_dir()
         logger.info(f"Initialized Autotune client with path: {autotune_path}")
 
     def run_autotune(
         self,
-        profile_data: dict[str, Any],
-        entries: list[dict[str, Any]],
-        treatments: list[dict[str, Any]],
+        profile_data: dict[str, Any] | bytes,
+        entries: list[dict[str, Any]] | bytes,
+        treatments: list[dict[str, Any]] | bytes,
         days: int = 7,
     ) -> dict[str, Any]:
         """
         Run autotune analysis on historical data.
 
+        Any input may be passed as pre-serialized JSON bytes, in which case
+        it is written to disk as-is.
+
         Args:
-            profile_data: Current profile to use as baseline
-            entries: List of glucose entries
-            treatments: List of treatment entries
+            profile_data: Current profile to use as baseline, or JSON bytes
+            entries: List of glucose entries, or the list as JSON bytes
+            treatments: List of treatment entries, or the list as JSON bytes
             days: Number of days to analyze
 
         Returns:
@@ -53,7 +225,7 @@ class AutotuneClient:
         """
         logger.info(f"Running autotune analysis for {days} days")
 
-        with tempfile.TemporaryDirectory() as tmpdir:
+        with tempfile.TemporaryDirectory(dir=self._tmp_dir) as tmpdir:
             tmppath = Path(tmpdir)
 
             # Write input files
@@ -63,9 +235,20 @@ class AutotuneClient:
             output_dir = tmppath / "autotune"
             output_dir.mkdir()
 
-            profile_file.write_text(json.dumps(profile_data, indent=2))
-            entries_file.write_text(json.dumps(entries, indent=2))
-            treatments_file.write_text(json.dumps(treatments, indent=2))
+            # oref0-autotune does not need pretty-printed input, so write
+            # compact JSON. The files are independent and written in parallel;
+            # the GIL is released while the large files hit the disk.
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                futures = [
+                    executor.submit(_write_json, path, data)
+                    for path, data in (
+                        (profile_file, profile_data),
+                        (entries_file, entries),
+                        (treatments_file, treatments),
+                    )
+                ]
+                for future in futures:
+                    future.result()
 
             logger.debug("Wrote input files to %s", tmpdir)
 
@@ -74,7 +257,7 @@ class AutotuneClient:
                 cmd = [
                     self.autotune_path,
                     "--dir",
-                    str(tmpdir),
+                    tmpdir,
                     "--ns-entries",
                     str(entries_file),
                     "--ns-treatments",
@@ -85,27 +268,19 @@ class AutotuneClient:
                     str(days),
                 ]
 
-                logger.debug(f"Executing autotune command: {' '.join(cmd)}")
+                # Only build the command string when it will be logged
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Executing autotune command: %s", " ".join(cmd))
 
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    check=True,
-                    timeout=600,  # 10 minute timeout
-                )
-
-                logger.debug("Autotune stdout: %s", result.stdout)
-                if result.stderr:
-                    logger.debug("Autotune stderr: %s", result.stderr)
+                _run_process(cmd, timeout=600)  # 10 minute timeout
 
             except subprocess.TimeoutExpired as e:
                 logger.error("Autotune execution timed out")
                 raise ValueError("Autotune analysis timed out") from e
             except subprocess.CalledProcessError as e:
                 logger.error(f"Autotune failed with exit code {e.returncode}")
-                logger.error(f"stdout: {e.stdout}")
-                logger.error(f"stderr: {e.stderr}")
+                if e.stderr:
+                    logger.error("stderr: %s", e.stderr.decode(errors="replace"))
                 raise
 
             # Read results
@@ -116,11 +291,39 @@ class AutotuneClient:
                     "Check that enough valid data was provided."
                 )
 
-            recommendations = json.loads(recommendations_file.read_text())
+            recommendations = loads(recommendations_file.read_bytes())
 
             logger.info("Successfully completed autotune analysis")
             return recommendations
 
+    def run_autotune_raw(
+        self,
+        profile_bytes: bytes,
+        entries_bytes: bytes,
+        treatments_bytes: bytes,
+        days: int = 7,
+    ) -> dict[str, Any]:
+        """
+        Run autotune analysis on pre-serialized JSON input.
+
+        The bytes are written to autotune's input files without any parsing,
+        e.g. the response bodies from NightscoutClient.get_historical_data_raw.
+
+        Args:
+            profile_bytes: Current profile as JSON
+            entries_bytes: JSON array of glucose entries
+            treatments_bytes: JSON array of treatment entries
+            days: Number of days to analyze
+
+        Returns:
+            Dict containing autotune recommendations
+
+        Raises:
+            subprocess.CalledProcessError: If autotune execution fails
+            ValueError: If autotune produces invalid output
+        """
+        return self.run_autotune(profile_bytes, entries_bytes, treatments_bytes, days)
+
     def upload_profile(
         self, profile_data: dict[str, Any], nightscout_url: str, api_secret: str
     ) -> dict[str, Any]:
@@ -148,7 +351,7 @@ class AutotuneClient:
 
             # Write profile to file
             profile_file = tmppath / "profile.json"
-            profile_file.write_text(json.dumps(profile_data, indent=2))
+            _write_json(profile_file, profile_data)
 
             try:
                 # Use oref0-upload command if available
@@ -1,21 +1,45 @@
 """Client for interacting with Nightscout API."""
 
+import asyncio
 import hashlib
 import logging
-from datetime import datetime, timedelta
-from functools import cached_property
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+from functools import cached_property, partial
 from typing import Any
 
 import requests
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from requests import Session
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
-from src.app.models.nightscout import NightscoutProfile, ProfileStore
+from app.clients._json import dumps, fragment, loads
+from app.models.nightscout import NightscoutProfile, ProfileStore
 
 logger = logging.getLogger(__name__)
 
+# Fields requested from Nightscout (server-side projection) when the records
+# only feed autotune. Leaving out ids, devices and notes shrinks the payloads,
+# but the records then lack optional fields of the validated models, so the
+# projection is opt-in through autotune_fields.
+_ENTRY_FIELDS = "date,dateString,sgv,type"
+_TREATMENT_FIELDS = (
+    "created_at,timestamp,eventType,insulin,carbs,rate,absolute,duration"
+)
+
+
+def _epoch_ms(moment: datetime) -> int:
+    """Return a datetime in epoch milliseconds; naive values are local time."""
+    return int(moment.timestamp() * 1000)
+
+
+def _utc_iso(moment: datetime) -> str:
+    """Format a datetime like Nightscout's UTC timestamps; naive is local time."""
+    utc = moment.astimezone(UTC).isoformat(timespec="milliseconds")
+    return utc.replace("+00:00", "Z")
+
 
 class NightscoutClient(BaseModel):
     """
@@ -31,9 +55,54 @@ class NightscoutClient(BaseModel):
     api_secret: str
     timeout: int = 30
 
+    def __init__(self, url: str, api_secret: str, timeout: int = 30):
+        """
+        Initialize the client.
+
+        Args:
+            url: Base URL of the Nightscout instance, must use HTTPS
+            api_secret: Nightscout API secret
+            timeout: Request timeout in seconds
+
+        Raises:
+            ValueError: If the URL does not use HTTPS
+        """
+        super().__init__(url=url, api_secret=api_secret, timeout=timeout)
+
+    @field_validator("url")
+    @classmethod
+    def _check_url(cls, url: str) -> str:
+        """Validate and normalize the URL on every construction path."""
+        return cls._validate_url(url)
+
+    @staticmethod
+    def _validate_url(url: str) -> str:
+        """
+        Validate a Nightscout base URL and normalize it.
+
+        Args:
+            url: Base URL of the Nightscout instance
+
+        Returns:
+            The URL without a trailing slash
+
+        Raises:
+            ValueError: If the URL does not use HTTPS
+        """
+        # The API secret hash is sent with every request, never in plain text
+        if not url.startswith("https://"):
+            raise ValueError(f"Nightscout URL must use HTTPS: {url}")
+        return url.rstrip("/")
+
     @cached_property
     def _session(self) -> Session:
-        """Setup requests session with retries."""
+        """
+        Setup requests session with retries.
+
+        The session is shared by all calls so connections are pooled and
+        kept alive, and it carries the authentication headers so they are
+        not rebuilt per request.
+        """
         session = Session()
         retry_strategy = Retry(
             total=3,
@@ -41,15 +110,27 @@ class NightscoutClient(BaseModel):
             status_forcelist=[429, 500, 502, 503, 504],
             allowed_methods=["GET", "POST", "PUT"],
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        # Allow plenty of pooled connections per host so concurrent fetches
+        # never wait on, or discard, a connection
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=32,
+            max_retries=retry_strategy,
+            pool_block=False,
+        )
+        # Only HTTPS URLs pass _validate_url, so only that scheme is pooled
         session.mount("https://", adapter)
+        session.headers.update(self._auth_headers)
         return session
 
-    @property
+    @cached_property
     def _auth_headers(self) -> dict[str, str]:
         """
         Generate authentication headers for Nightscout API.
 
+        The secret does not change for the lifetime of the client, so the
+        hash is computed once and cached.
+
         Returns:
             Dict containing API-SECRET header with hashed secret
         """
@@ -60,28 +141,44 @@ class NightscoutClient(BaseModel):
             "Accept": "application/json",
         }
 
-    def _get_profiles(self) -> NightscoutProfile:
+    def _get_profile_document(self) -> dict[str, Any]:
         """
-        Internal method to fetch all profiles from Nightscout.
+        Internal method to fetch the current profile document from Nightscout.
 
         Returns:
-            NightscoutProfile containing all profile data
+            Profile document as returned by the API, not validated
+
+        Raises:
+            requests.HTTPError: If API request fails
+            ValueError: If Nightscout has no profiles
         """
         url = f"{self.url}/api/v1/profile"
-        headers = self._auth_headers
 
         logger.info("Fetching all profiles from Nightscout")
 
-        response = self._session.get(url, headers=headers, timeout=self.timeout)
+        response = self._session.get(url, timeout=self.timeout)
         response.raise_for_status()
-        data = response.json()
+        data = loads(response.content)
 
         if not data:
             raise ValueError("No profiles found in Nightscout")
 
-        profile_doc = data[0] if isinstance(data, list) else data
+        return data[0] if isinstance(data, list) else data
+
+    def get_profiles(self) -> NightscoutProfile:
+        """
+        Load the profile document with all profiles from Nightscout.
+
+        Returns:
+            NightscoutProfile containing all profile data
 
-        profile = NightscoutProfile(**profile_doc)
+        Raises:
+            requests.HTTPError: If API request fails
+            ValueError: If Nightscout has no profiles
+        """
+        # model_validate reads the mapping directly instead of splatting it
+        # into a kwargs copy
+        profile = NightscoutProfile.model_validate(self._get_profile_document())
 
         logger.info(
             f"Successfully loaded profile with {profile.num_profiles} profile(s)"
@@ -102,7 +199,7 @@ class NightscoutClient(BaseModel):
             requests.HTTPError: If API request fails
             ValueError: If profile_name specified but not found
         """
-        profiles = self._get_profiles()
+        profiles = self.get_profiles()
         profile_store = profiles.store.get(profile_name)
         if not profile_store:
             raise ValueError(
@@ -128,30 +225,56 @@ class NightscoutClient(BaseModel):
         Raises:
             requests.HTTPError: If API request fails
         """
-        url = f"{self.url}/api/v1/entries"
-        headers = self._auth_headers
+        # Parse the raw body directly; orjson is much faster than the
+        # stdlib decoder behind response.json() on large payloads
+        entries = loads(self.get_entries_raw(start_date, end_date, count))
+
+        logger.info(f"Successfully loaded {len(entries)} entries")
+        return entries
+
+    def get_entries_raw(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        count: int = 100000,
+        autotune_fields: bool = False,
+    ) -> bytes:
+        """
+        Load glucose entries from Nightscout as the raw JSON response body.
+
+        Use this when the entries are passed on without being inspected,
+        e.g. straight to autotune, to avoid parsing them at all.
+
+        Args:
+            start_date: Start date for entries
+            end_date: End date for entries
+            count: Maximum number of entries to retrieve
+            autotune_fields: Request only the fields autotune reads
 
-        # Convert dates to ISO format
-        start_iso = start_date.isoformat()
-        end_iso = end_date.isoformat()
+        Returns:
+            JSON array of glucose entries as bytes
 
+        Raises:
+            requests.HTTPError: If API request fails
+        """
+        url = f"{self.url}/api/v1/entries"
+
+        # Query on the epoch millisecond date, which unlike dateString does
+        # not depend on the timezone the uploader formatted it in
         params = {
-            "find[dateString][$gte]": start_iso,
-            "find[dateString][$lte]": end_iso,
+            "find[date][$gte]": _epoch_ms(start_date),
+            "find[date][$lte]": _epoch_ms(end_date),
             "count": count,
         }
+        if autotune_fields:
+            params["fields"] = _ENTRY_FIELDS
 
         logger.info(f"Fetching entries from {start_date} to {end_date}")
 
         try:
-            response = self._session.get(
-                url, headers=headers, params=params, timeout=self.timeout
-            )
+            response = self._session.get(url, params=params, timeout=self.timeout)
             response.raise_for_status()
-            entries = response.json()
-
-            logger.info(f"Successfully loaded {len(entries)} entries")
-            return entries
+            return response.content
 
         except requests.RequestException as e:
             logger.error(f"Failed to fetch entries: {e}")
@@ -174,43 +297,64 @@ class NightscoutClient(BaseModel):
         Raises:
             requests.HTTPError: If API request fails
         """
-        url = f"{self.url}/api/v1/treatments"
-        headers = self._auth_headers
+        treatments = loads(self.get_treatments_raw(start_date, end_date, count))
+
+        logger.info(f"Successfully loaded {len(treatments)} treatments")
+        return treatments
+
+    def get_treatments_raw(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        count: int = 100000,
+        autotune_fields: bool = False,
+    ) -> bytes:
+        """
+        Load treatment entries from Nightscout as the raw JSON response body.
 
-        # Convert dates to ISO format
-        start_iso = start_date.isoformat()
-        end_iso = end_date.isoformat()
+        Args:
+            start_date: Start date for treatments
+            end_date: End date for treatments
+            count: Maximum number of treatments to retrieve
+            autotune_fields: Request only the fields autotune reads
 
+        Returns:
+            JSON array of treatment entries as bytes
+
+        Raises:
+            requests.HTTPError: If API request fails
+        """
+        url = f"{self.url}/api/v1/treatments"
+
+        # created_at is stored as a UTC ISO string and compared as a string
         params = {
-            "find[created_at][$gte]": start_iso,
-            "find[created_at][$lte]": end_iso,
+            "find[created_at][$gte]": _utc_iso(start_date),
+            "find[created_at][$lte]": _utc_iso(end_date),
             "count": count,
         }
+        if autotune_fields:
+            params["fields"] = _TREATMENT_FIELDS
 
         logger.info(f"Fetching treatments from {start_date} to {end_date}")
 
         try:
-            response = self._session.get(
-                url, headers=headers, params=params, timeout=self.timeout
-            )
+            response = self._session.get(url, params=params, timeout=self.timeout)
             response.raise_for_status()
-            treatments = response.json()
-
-            logger.info(f"Successfully loaded {len(treatments)} treatments")
-            return treatments
+            return response.content
 
         except requests.RequestException as e:
             logger.error(f"Failed to fetch treatments: {e}")
             raise
 
     def get_historical_data(
-        self, days: int = 7
+        self, days: int = 7, end_date: datetime | None = None
     ) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
         """
         Load historical glucose and treatment data for specified number of days.
 
         Args:
             days: Number of days of historical data to load
+            end_date: End of the loaded period, defaults to now
 
         Returns:
             Tuple of (entries, treatments) lists
@@ -218,14 +362,127 @@ class NightscoutClient(BaseModel):
         Raises:
             requests.HTTPError: If API request fails
         """
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
+        return self._fetch_concurrently(
+            self.get_entries, self.get_treatments, days, end_date
+        )
+
+    def get_historical_data_raw(
+        self,
+        days: int = 7,
+        autotune_fields: bool = False,
+        end_date: datetime | None = None,
+    ) -> tuple[bytes, bytes]:
+        """
+        Load historical data for specified number of days as raw JSON bytes.
+
+        Args:
+            days: Number of days of historical data to load
+            autotune_fields: Request only the fields autotune reads; use this
+                when the records go straight to autotune
+            end_date: End of the loaded period, defaults to now
+
+        Returns:
+            Tuple of (entries, treatments) JSON arrays as bytes
+
+        Raises:
+            requests.HTTPError: If API request fails
+        """
+        return self._fetch_concurrently(
+            partial(self.get_entries_raw, autotune_fields=autotune_fields),
+            partial(self.get_treatments_raw, autotune_fields=autotune_fields),
+            days,
+            end_date,
+        )
 
-        entries = self.get_entries(start_date, end_date)
-        treatments = self.get_treatments(start_date, end_date)
+    async def get_historical_data_raw_async(
+        self,
+        days: int = 7,
+        autotune_fields: bool = False,
+        end_date: datetime | None = None,
+    ) -> tuple[bytes, bytes]:
+        """
+        Load historical data as raw JSON bytes without blocking the event loop.
+
+        Both requests run in worker threads and are awaited together, so the
+        total latency is that of the slower request.
 
+        Args:
+            days: Number of days of historical data to load
+            autotune_fields: Request only the fields autotune reads
+            end_date: End of the loaded period, defaults to now
+
+        Returns:
+            Tuple of (entries, treatments) JSON arrays as bytes
+
+        Raises:
+            requests.HTTPError: If API request fails
+        """
+        start_date, end_date = self._date_range(days, end_date)
+
+        # Create the shared session before the threads race to do so
+        _ = self._session
+        entries, treatments = await asyncio.gather(
+            asyncio.to_thread(
+                self.get_entries_raw,
+                start_date,
+                end_date,
+                autotune_fields=autotune_fields,
+            ),
+            asyncio.to_thread(
+                self.get_treatments_raw,
+                start_date,
+                end_date,
+                autotune_fields=autotune_fields,
+            ),
+        )
         return entries, treatments
 
+    def _fetch_concurrently(
+        self,
+        fetch_entries: Callable[[datetime, datetime], Any],
+        fetch_treatments: Callable[[datetime, datetime], Any],
+        days: int,
+        end_date: datetime | None,
+    ) -> tuple[Any, Any]:
+        """
+        Run an entries and a treatments fetch for the last days concurrently.
+
+        Args:
+            fetch_entries: Method loading entries for a date range
+            fetch_treatments: Method loading treatments for a date range
+            days: Number of days of historical data to load
+            end_date: End of the loaded period, defaults to now
+
+        Returns:
+            Tuple of (entries, treatments) as returned by the fetch methods
+        """
+        start_date, end_date = self._date_range(days, end_date)
+
+        # Entries and treatments are independent requests, so fetch them
+        # concurrently. Create the shared session up front so both threads
+        # use the same connection pool.
+        _ = self._session
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            entries_future = executor.submit(fetch_entries, start_date, end_date)
+            treatments_future = executor.submit(fetch_treatments, start_date, end_date)
+            return entries_future.result(), treatments_future.result()
+
+    @staticmethod
+    def _date_range(days: int, end_date: datetime | None) -> tuple[datetime, datetime]:
+        """
+        Return the (start, end) of a period of days ending at end_date.
+
+        Args:
+            days: Length of the period in days
+            end_date: End of the period, defaults to now in UTC
+
+        Returns:
+            Tuple of (start_date, end_date)
+        """
+        if end_date is None:
+            end_date = datetime.now(UTC)
+        return end_date - timedelta(days=days), end_date
+
     def update_profile(
         self, profile_data: dict[str, Any], profile_name: str | None = None
     ) -> dict[str, Any]:
@@ -244,32 +501,79 @@ class NightscoutClient(BaseModel):
 
         Raises:
             requests.HTTPError: If API request fails
-            ValueError: If profile not found
+            ValueError: If no profile name is given and there is no default
+        """
+        return self._post_profile(profile_data, profile_name)
+
+    def update_profile_raw(
+        self, profile_bytes: bytes, profile_name: str | None = None
+    ) -> dict[str, Any]:
+        """
+        Update a profile in Nightscout from a pre-serialized store entry.
+
+        The bytes are embedded in the request body as they are, without
+        being decoded and encoded again.
+
+        Args:
+            profile_bytes: Profile data to update as JSON (store entry format)
+            profile_name: Name of the profile to update (uses default if None)
+
+        Returns:
+            Dict containing the updated profile response
+
+        Raises:
+            requests.HTTPError: If API request fails
+            ValueError: If no profile name is given and there is no default
+        """
+        return self._post_profile(fragment(profile_bytes), profile_name)
+
+    def _post_profile(
+        self, profile_data: Any, profile_name: str | None
+    ) -> dict[str, Any]:
+        """
+        Store a profile in the current profile document and post it back.
+
+        Args:
+            profile_data: Store entry, as a dict or a JSON fragment
+            profile_name: Name of the profile to update (uses default if None)
+
+        Returns:
+            Dict containing the updated profile response
+
+        Raises:
+            requests.HTTPError: If API request fails
+            ValueError: If no profile name is given and there is no default
         """
         # First, get the current profile document
-        current_profile = self._get_profiles().default_profile
+        current_profile = self._get_profile_document()
 
-        # Update the store with new profile data
-        if "store" not in current_profile:
-            current_profile["store"] = {}
+        target_profile = profile_name or current_profile.get("defaultProfile")
+        if not target_profile:
+            raise ValueError(
+                "No profile name specified and the profile document has no "
+                "default profile"
+            )
 
-        current_profile["store"][target_profile] = profile_data
+        # Update the store with new profile data
+        current_profile.setdefault("store", {})[target_profile] = profile_data
 
         # Update timestamp
         current_profile["mills"] = int(datetime.now().timestamp() * 1000)
 
         # POST the updated profile
         url = f"{self.url}/api/v1/profile"
-        headers = self._auth_headers
 
         logger.info(f"Updating profile '{target_profile}' in Nightscout")
 
         try:
-            response = self.session.post(
-                url, headers=headers, json=current_profile, timeout=self.timeout
+            # Serialize ourselves: requests' json= uses the stdlib encoder and
+            # cannot embed pre-serialized fragments. The session already sends
+            # the JSON Content-Type header.
+            response = self._session.post(
+                url, data=dumps(current_profile), timeout=self.timeout
             )
             response.raise_for_status()
-            result = response.json()
+            result = loads(response.content)
 
             logger.info(f"Successfully updated profile '{target_profile}'")
             return result
@@ -1,8 +1,9 @@
 """Pydantic models for Nightscout data structures."""
 
+from array import array
 from datetime import datetime
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 
 class BasalScheduleEntry(BaseModel):
@@ -42,6 +43,10 @@ class TargetEntry(BaseModel):
 class ProfileStore(BaseModel):
     """Individual profile within a profile store."""
 
+    # Validating an existing instance returns it unchanged instead of
+    # rebuilding it (pydantic's default, relied upon by the services)
+    model_config = ConfigDict(revalidate_instances="never")
+
     dia: float = Field(..., gt=0, description="Duration of insulin action in hours")
     carbratio: list[CarbRatioEntry] = Field(..., description="Carb ratio schedule")
     sens: list[SensitivityEntry] = Field(
@@ -57,7 +62,11 @@ class ProfileStore(BaseModel):
 class NightscoutProfile(BaseModel):
     """Complete Nightscout profile document."""
 
-    _id: str = Field(..., description="Profile document ID")
+    # Pydantic does not allow field names with a leading underscore, so the
+    # MongoDB document id is exposed as id and read from the _id key
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: str = Field(..., alias="_id", description="Profile document ID")
     defaultProfile: str = Field(..., description="Name of the default profile")
     store: dict[str, ProfileStore] = Field(
         ..., description="Profile store with named profiles"
@@ -86,7 +95,9 @@ class NightscoutProfile(BaseModel):
 class NightscoutEntry(BaseModel):
     """Nightscout glucose entry."""
 
-    _id: str = Field(..., description="Entry ID")
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: str | None = Field(None, alias="_id", description="Entry ID")
     sgv: int = Field(..., ge=20, le=600, description="Glucose value in mg/dL")
     date: int = Field(..., description="Timestamp in milliseconds")
     dateString: str = Field(..., description="ISO format date string")
@@ -98,7 +109,9 @@ class NightscoutEntry(BaseModel):
 class NightscoutTreatment(BaseModel):
     """Nightscout treatment entry."""
 
-    _id: str = Field(..., description="Treatment ID")
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: str | None = Field(None, alias="_id", description="Treatment ID")
     eventType: str = Field(..., description="Type of treatment")
     created_at: str = Field(..., description="Creation timestamp")
     timestamp: str | None = Field(None, description="Treatment timestamp")
@@ -110,6 +123,13 @@ class NightscoutTreatment(BaseModel):
     enteredBy: str | None = Field(None, description="Who entered the treatment")
 
 
+# Validators/serializers for whole record lists. Building a TypeAdapter
+# compiles its core schema, so they are created once here and shared; never
+# construct them per request.
+ENTRIES_ADAPTER = TypeAdapter(list[NightscoutEntry])
+TREATMENTS_ADAPTER = TypeAdapter(list[NightscoutTreatment])
+
+
 class HistoricalData(BaseModel):
     """Container for historical Nightscout data."""
 
@@ -117,3 +137,25 @@ class HistoricalData(BaseModel):
     treatments: list[NightscoutTreatment] = Field(..., description="Treatment entries")
     start_date: datetime = Field(..., description="Start date of data range")
     end_date: datetime = Field(..., description="End date of data range")
+
+    @property
+    def start_date_ms(self) -> int:
+        """Return the start of the data range in epoch milliseconds."""
+        return int(self.start_date.timestamp() * 1000)
+
+    @property
+    def end_date_ms(self) -> int:
+        """Return the end of the data range in epoch milliseconds."""
+        return int(self.end_date.timestamp() * 1000)
+
+    # Built on every access: the model is mutable, and a cached column would
+    # go stale when the entries change or are replaced through model_copy
+    @property
+    def sgv_values(self) -> array:
+        """Return the glucose values of all entries as a contiguous int32 array."""
+        return array("i", [entry.sgv for entry in self.entries])
+
+    @property
+    def entry_dates(self) -> array:
+        """Return the entry timestamps in milliseconds as a contiguous int64 array."""
+        return array("q", [entry.date for entry in self.entries])
@@ -0,0 +1,63 @@
+"""Time-of-day conversions shared by the services."""
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_MINUTE = 60
+
+
+def to_seconds(hours: int, minutes: int) -> int:
+    """
+    Convert a time of day to seconds from midnight.
+
+    Args:
+        hours: Hour of the day (0-23)
+        minutes: Minute of the hour (0-59)
+
+    Returns:
+        Seconds from midnight
+    """
+    return hours * SECONDS_PER_HOUR + minutes * SECONDS_PER_MINUTE
+
+
+def format_hhmm(seconds: int) -> str:
+    """
+    Format seconds from midnight as an HH:MM time.
+
+    Args:
+        seconds: Seconds from midnight
+
+    Returns:
+        Time in HH:MM format
+    """
+    hours, remainder = divmod(seconds, SECONDS_PER_HOUR)
+    return f"{hours:02d}:{remainder // SECONDS_PER_MINUTE:02d}"
+
+
+# Autotune schedules are aligned to 30-minute boundaries, so the conversion
+# of every such start time is precomputed:
+# "HH:MM:SS" -> ("HH:MM", seconds from midnight)
+_HALF_HOUR_SLOTS = {
+    f"{format_hhmm(seconds)}:00": (format_hhmm(seconds), seconds)
+    for seconds in range(0, 24 * SECONDS_PER_HOUR, 30 * SECONDS_PER_MINUTE)
+}
+
+
+def parse_start_time(start: str) -> tuple[str, int]:
+    """
+    Parse an HH:MM:SS start time.
+
+    Args:
+        start: Start time in HH:MM:SS format
+
+    Returns:
+        Tuple of (HH:MM time, seconds from midnight)
+
+    Raises:
+        ValueError: If the hours or minutes are missing or not numbers
+    """
+    slot = _HALF_HOUR_SLOTS.get(start)
+    if slot is not None:
+        return slot
+
+    # Not on a 30-minute boundary, parse it
+    hours, minutes = start.split(":")[:2]
+    return f"{hours}:{minutes}", to_seconds(int(hours), int(minutes))
@@ -2,14 +2,47 @@
 
 import logging
 from datetime import datetime
+from typing import Any
 
 from app.clients.autotune_client import AutotuneClient
-from app.models.autotune import AutotuneRecommendations, AutotuneResult
-from app.models.nightscout import HistoricalData, ProfileStore
+from app.models.autotune import (
+    AutotuneBasalEntry,
+    AutotuneRecommendations,
+    AutotuneResult,
+)
+from app.models.nightscout import (
+    ENTRIES_ADAPTER,
+    TREATMENTS_ADAPTER,
+    BasalScheduleEntry,
+    HistoricalData,
+    ProfileStore,
+)
+from app.services._fast_time import parse_start_time
 
 logger = logging.getLogger(__name__)
 
 
+def _to_basal_schedule_entry(basal_entry: AutotuneBasalEntry) -> BasalScheduleEntry:
+    """
+    Convert an autotune basal entry to Nightscout format.
+
+    Args:
+        basal_entry: Basal entry with start time in HH:MM:SS format
+
+    Returns:
+        BasalScheduleEntry with HH:MM time and seconds from midnight
+    """
+    time_str, time_as_seconds = parse_start_time(basal_entry.start)
+
+    # Skip validation: the rate was already validated (ge=0) by
+    # AutotuneBasalEntry and the time fields are derived from its start time
+    return BasalScheduleEntry.model_construct(
+        time=time_str,
+        value=basal_entry.rate,
+        timeAsSeconds=time_as_seconds,
+    )
+
+
 class AutotuneService:
     """
     High-level service for Autotune operations.
@@ -53,18 +86,83 @@ class AutotuneService:
         """
         logger.info(f"Running autotune analysis for profile '{profile_name}'")
 
-        # Convert Pydantic models to dicts for autotune client
+        # Convert Pydantic models for autotune client. Entries and treatments
+        # go straight to JSON bytes, skipping an intermediate dict per record.
         profile_data = profile.model_dump()
-        entries_data = [entry.model_dump() for entry in historical_data.entries]
-        treatments_data = [
-            treatment.model_dump() for treatment in historical_data.treatments
-        ]
+        # by_alias keeps Nightscout's _id key in the autotune input
+        entries_data = ENTRIES_ADAPTER.dump_json(historical_data.entries, by_alias=True)
+        treatments_data = TREATMENTS_ADAPTER.dump_json(
+            historical_data.treatments, by_alias=True
+        )
 
-        # Run autotune
-        result_data = self.client.run_autotune(
-            profile_data, entries_data, treatments_data, days
+        return self._analyze(
+            profile_data, entries_data, treatments_data, profile_name, days
         )
 
+    def run_analysis_raw(
+        self,
+        profile: ProfileStore,
+        entries: list[dict[str, Any]] | bytes,
+        treatments: list[dict[str, Any]] | bytes,
+        profile_name: str,
+        days: int = 7,
+    ) -> AutotuneRecommendations:
+        """
+        Run autotune analysis on raw Nightscout records.
+
+        Fast path for data straight from NightscoutClient: the records are
+        forwarded to autotune as-is instead of being validated into models
+        and dumped back to dicts. Only the autotune output is validated.
+        Passing the raw response bodies from
+        NightscoutClient.get_historical_data_raw skips JSON parsing entirely;
+        fetch them with autotune_fields=True to also shrink the transfer.
+
+        Args:
+            profile: Current profile to use as baseline
+            entries: Glucose entries as returned by Nightscout, as dicts or
+                the raw JSON response body
+            treatments: Treatments as returned by Nightscout, as dicts or
+                the raw JSON response body
+            profile_name: Name of the profile being analyzed
+            days: Number of days to analyze
+
+        Returns:
+            Validated AutotuneRecommendations model
+
+        Raises:
+            ValidationError: If autotune output is invalid
+            ValueError: If autotune fails or produces no results
+        """
+        logger.info(f"Running autotune analysis for profile '{profile_name}'")
+
+        return self._analyze(
+            profile.model_dump(), entries, treatments, profile_name, days
+        )
+
+    def _analyze(
+        self,
+        profile_data: dict[str, Any],
+        entries: list[dict[str, Any]] | bytes,
+        treatments: list[dict[str, Any]] | bytes,
+        profile_name: str,
+        days: int,
+    ) -> AutotuneRecommendations:
+        """
+        Run autotune on converted input and wrap the validated result.
+
+        Args:
+            profile_data: Profile to use as baseline
+            entries: Glucose entries as dicts or JSON bytes
+            treatments: Treatments as dicts or JSON bytes
+            profile_name: Name of the profile being analyzed
+            days: Number of days to analyze
+
+        Returns:
+            Validated AutotuneRecommendations model
+        """
+        # Run autotune
+        result_data = self.client.run_autotune(profile_data, entries, treatments, days)
+
         # Validate and wrap result
         result = AutotuneResult(**result_data)
 
@@ -99,44 +197,38 @@ class AutotuneService:
         """
         logger.info("Applying autotune recommendations to profile")
 
-        # Create a copy of the profile
-        updated_profile = profile.model_copy(deep=True)
-
-        # Apply recommendations
         result = recommendations.result
 
+        # Shallow copy: every schedule changed below is replaced by a new list
+        # of new entries, so the original profile is never mutated and there
+        # is no point deep-copying entries that are about to be discarded
+        updated_profile = profile.model_copy(deep=False)
+
         # Update carb ratio for all entries
-        for entry in updated_profile.carbratio:
-            entry.value = result.carb_ratio
+        updated_profile.carbratio = [
+            entry.model_copy(update={"value": result.carb_ratio})
+            for entry in profile.carbratio
+        ]
 
         # Update insulin sensitivity for all entries
-        for entry in updated_profile.sens:
-            entry.value = result.sens
-
-        # Update basal rates from autotune basalprofile
-        if result.basalprofile:
-            # Clear existing basal schedule
-            updated_profile.basal = []
-
-            # Convert autotune basal format to Nightscout format
-            from app.models.nightscout import BasalScheduleEntry
-
-            for basal_entry in result.basalprofile:
-                # Convert HH:MM:SS to HH:MM
-                time_parts = basal_entry.start.split(":")
-                time_str = f"{time_parts[0]}:{time_parts[1]}"
-
-                # Calculate seconds from midnight
-                hours = int(time_parts[0])
-                minutes = int(time_parts[1])
-                time_as_seconds = hours * 3600 + minutes * 60
-
-                ns_basal = BasalScheduleEntry(
-                    time=time_str,
-                    value=basal_entry.rate,
-                    timeAsSeconds=time_as_seconds,
+        updated_profile.sens = [
+            entry.model_copy(update={"value": result.sens}) for entry in profile.sens
+        ]
+
+        # Replace basal rates with the autotune basalprofile
+        basalprofile = result.basalprofile
+        if len(basalprofile) == 1 and basalprofile[0].start == "00:00:00":
+            # A single flat rate for the whole day is the common case and
+            # needs no time conversion
+            updated_profile.basal = [
+                BasalScheduleEntry.model_construct(
+                    time="00:00", value=basalprofile[0].rate, timeAsSeconds=0
                 )
-                updated_profile.basal.append(ns_basal)
+            ]
+        elif basalprofile:
+            updated_profile.basal = [
+                _to_basal_schedule_entry(basal_entry) for basal_entry in basalprofile
+            ]
 
         # Update DIA if provided
         if result.dia:
@@ -1,19 +1,77 @@
 """Service for Nightscout operations with Pydantic model validation."""
 
 import logging
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from pydantic import TypeAdapter, ValidationError
+from pydantic_core import from_json
 
 from app.clients.nightscout_client import NightscoutClient
 from app.models.nightscout import (
+    ENTRIES_ADAPTER,
+    TREATMENTS_ADAPTER,
     HistoricalData,
-    NightscoutEntry,
     NightscoutProfile,
-    NightscoutTreatment,
     ProfileStore,
 )
 
 logger = logging.getLogger(__name__)
 
+# Profiles change at most a few times a day, so the validated profile
+# document is reused for a short while instead of being fetched on every call
+_PROFILE_CACHE_TTL = 60.0
+
+
+def _validate_records(adapter: TypeAdapter, raw: bytes, kind: str) -> list[Any]:
+    """
+    Parse and validate a JSON array of records, skipping invalid ones.
+
+    The whole document is parsed and validated in a single pass. When that
+    fails, the indices of the invalid records are taken from the collected
+    errors and the remaining records are validated again as one batch, so
+    a few bad records never fall back to validating records one by one.
+
+    Args:
+        adapter: TypeAdapter for a list of records
+        raw: JSON array as returned by the Nightscout API
+        kind: Record kind used in log messages
+
+    Returns:
+        List of validated model instances
+
+    Raises:
+        ValidationError: If the document itself is not a JSON array
+    """
+    try:
+        return adapter.validate_json(raw)
+    except ValidationError as e:
+        # Computed once, e.errors() builds a new list of dicts on every call
+        errors = e.errors(include_url=False, include_input=False)
+        # Errors without a location concern the document, not a record
+        if any(not error["loc"] for error in errors):
+            raise
+
+    invalid = {}
+    for error in errors:
+        invalid.setdefault(error["loc"][0], error)
+
+    for index, error in invalid.items():
+        logger.warning("Skipping invalid %s at index %d: %s", kind, index, error["msg"])
+
+    records = from_json(raw)
+    # Nothing survives when every record failed, skip the second pass
+    if len(invalid) == len(records):
+        return []
+
+    # Feed the survivors as a generator; pydantic-core builds the validated
+    # list from it directly, without an intermediate filtered copy
+    return adapter.validate_python(
+        record for index, record in enumerate(records) if index not in invalid
+    )
+
 
 class NightscoutService:
     """
@@ -33,29 +91,80 @@ class NightscoutService:
             timeout: Request timeout in seconds
         """
         self.client = NightscoutClient(url, api_secret, timeout)
+        # All profiles live in one document: (monotonic fetch time, document)
+        self._profiles: tuple[float, NightscoutProfile] | None = None
+        self._profiles_lock = threading.Lock()
         logger.info("Initialized Nightscout service")
 
+    def clear_cache(self) -> None:
+        """Drop the cached profiles so the next call fetches them again."""
+        with self._profiles_lock:
+            self._profiles = None
+
     def get_profile(self, profile_name: str | None = None) -> NightscoutProfile:
         """
-        Load and validate a profile from Nightscout.
+        Load and validate the profile document from Nightscout.
 
         Args:
-            profile_name: Name of the profile to load. If None, loads default profile
+            profile_name: Profile that must be present in the store. If None,
+                the document is returned without checking for a profile
 
         Returns:
-            Validated NightscoutProfile model
+            Validated NightscoutProfile model, owned by the caller
 
         Raises:
             ValidationError: If profile data doesn't match expected format
             ValueError: If profile not found
         """
-        logger.info(f"Loading profile: {profile_name or 'default'}")
+        profiles = self._get_cached_profiles()
+        if profile_name is not None:
+            self._check_profile_name(profiles, profile_name)
+        # Callers may modify the profile, so they get a copy of the cached one
+        return profiles.model_copy(deep=True)
+
+    def _get_cached_profiles(self) -> NightscoutProfile:
+        """
+        Return the cached profile document, fetching it when missing or expired.
+
+        The returned instance is shared with the cache and must not be modified.
+
+        Returns:
+            Validated NightscoutProfile model
+        """
+        with self._profiles_lock:
+            if self._profiles is not None:
+                fetched_at, profiles = self._profiles
+                if time.monotonic() - fetched_at < _PROFILE_CACHE_TTL:
+                    logger.debug("Using cached profiles")
+                    return profiles
 
-        profile_data = self.client.get_profile(profile_name)
-        profile = NightscoutProfile(**profile_data)
+            logger.info("Loading profiles")
+            profiles = self.client.get_profiles()
+            self._profiles = (time.monotonic(), profiles)
 
-        logger.info(f"Successfully loaded profile with {len(profile.store)} profile(s)")
-        return profile
+        logger.info(
+            "Successfully loaded profile with %d profile(s)", len(profiles.store)
+        )
+        return profiles
+
+    @staticmethod
+    def _check_profile_name(profiles: NightscoutProfile, profile_name: str) -> None:
+        """
+        Ensure a profile is present in the profile store.
+
+        Args:
+            profiles: Profile document to look in
+            profile_name: Name of the profile
+
+        Raises:
+            ValueError: If profile not found
+        """
+        if profile_name not in profiles.store:
+            available = list(profiles.store.keys())
+            raise ValueError(
+                f"Profile '{profile_name}' not found in store. "
+                f"Available profiles: {available}"
+            )
 
     def get_profile_store(self, profile_name: str) -> ProfileStore:
         """
@@ -65,27 +174,25 @@ class NightscoutService:
             profile_name: Name of the profile to load from store
 
         Returns:
-            Validated ProfileStore model for the specified profile
+            Validated ProfileStore model for the specified profile, owned by
+            the caller
 
         Raises:
             ValidationError: If profile data doesn't match expected format
             ValueError: If profile not found
         """
-        logger.info(f"Loading profile store entry: {profile_name}")
-
-        profile = self.get_profile(profile_name)
+        logger.info("Loading profile store entry: %s", profile_name)
 
-        if profile_name not in profile.store:
-            available = list(profile.store.keys())
-            raise ValueError(
-                f"Profile '{profile_name}' not found in store. "
-                f"Available profiles: {available}"
-            )
+        # Read from the shared document and copy only the requested entry
+        profiles = self._get_cached_profiles()
+        self._check_profile_name(profiles, profile_name)
 
-        store_entry = ProfileStore(**profile.store[profile_name].model_dump())
+        # Already validated as part of the profile: model_validate hands the
+        # instance back as-is and only validates entries of another type
+        store_entry = ProfileStore.model_validate(profiles.store[profile_name])
 
-        logger.info(f"Successfully loaded profile store entry: {profile_name}")
-        return store_entry
+        logger.info("Successfully loaded profile store entry: %s", profile_name)
+        return store_entry.model_copy(deep=True)
 
     def get_historical_data(self, days: int = 7) -> HistoricalData:
         """
@@ -100,34 +207,71 @@ class NightscoutService:
         Raises:
             ValidationError: If data doesn't match expected format
         """
-        logger.info(f"Loading {days} days of historical data")
+        logger.info("Loading %d days of historical data", days)
+
+        # The client fetches exactly this range, so the stored dates match
+        # the window the records come from
+        end_date = datetime.now(UTC)
+        start_date = end_date - timedelta(days=days)
+
+        entries_raw, treatments_raw = self.client.get_historical_data_raw(
+            days, end_date=end_date
+        )
+        return self._build_historical_data(
+            entries_raw, treatments_raw, start_date, end_date
+        )
+
+    async def get_historical_data_async(self, days: int = 7) -> HistoricalData:
+        """
+        Load and validate historical glucose and treatment data without blocking.
+
+        Args:
+            days: Number of days of historical data to load
+
+        Returns:
+            Validated HistoricalData model containing entries and treatments
+
+        Raises:
+            ValidationError: If data doesn't match expected format
+        """
+        logger.info("Loading %d days of historical data", days)
 
-        end_date = datetime.now()
+        end_date = datetime.now(UTC)
         start_date = end_date - timedelta(days=days)
 
-        entries_raw, treatments_raw = self.client.get_historical_data(days)
-
-        # Validate entries
-        entries = []
-        for entry_data in entries_raw:
-            try:
-                entry = NightscoutEntry(**entry_data)
-                entries.append(entry)
-            except Exception as e:
-                logger.warning(f"Skipping invalid entry: {e}")
-                continue
-
-        # Validate treatments
-        treatments = []
-        for treatment_data in treatments_raw:
-            try:
-                treatment = NightscoutTreatment(**treatment_data)
-                treatments.append(treatment)
-            except Exception as e:
-                logger.warning(f"Skipping invalid treatment: {e}")
-                continue
-
-        historical_data = HistoricalData(
+        entries_raw, treatments_raw = await self.client.get_historical_data_raw_async(
+            days, end_date=end_date
+        )
+        return self._build_historical_data(
+            entries_raw, treatments_raw, start_date, end_date
+        )
+
+    def _build_historical_data(
+        self,
+        entries_raw: bytes,
+        treatments_raw: bytes,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> HistoricalData:
+        """
+        Validate raw entries and treatments into a HistoricalData model.
+
+        Args:
+            entries_raw: Entries JSON array as returned by the Nightscout API
+            treatments_raw: Treatments JSON array as returned by the Nightscout API
+            start_date: Start of the loaded period
+            end_date: End of the loaded period
+
+        Returns:
+            Validated HistoricalData model containing entries and treatments
+        """
+        # Validate straight from the response bodies, skipping the
+        # intermediate list of dicts
+        entries = _validate_records(ENTRIES_ADAPTER, entries_raw, "entry")
+        treatments = _validate_records(TREATMENTS_ADAPTER, treatments_raw, "treatment")
+
+        # Everything was validated above, so skip a second pass over the lists
+        historical_data = HistoricalData.model_construct(
             entries=entries,
             treatments=treatments,
             start_date=start_date,
@@ -135,8 +279,9 @@ class NightscoutService:
         )
 
         logger.info(
-            f"Successfully loaded {len(entries)} entries and "
-            f"{len(treatments)} treatments"
+            "Successfully loaded %d entries and %d treatments",
+            len(entries),
+            len(treatments),
         )
         return historical_data
 
@@ -154,11 +299,18 @@ class NightscoutService:
             ValidationError: If profile data is invalid
             requests.HTTPError: If API request fails
         """
-        logger.info(f"Syncing profile: {profile_name or 'default'}")
-
-        # Convert Pydantic model to dict for API
-        profile_data = profile_store.model_dump()
+        logger.info("Syncing profile: %s", profile_name or "default")
+
+        # Serialize straight to JSON bytes in pydantic-core, without an
+        # intermediate dict. The store entry replaces the stored one as a
+        # whole, and all of its fields are required, so exclude_unset only
+        # drops optional fields that were never given.
+        profile_bytes = profile_store.__pydantic_serializer__.to_json(
+            profile_store, exclude_unset=True
+        )
 
-        self.client.update_profile(profile_data, profile_name)
+        self.client.update_profile_raw(profile_bytes, profile_name)
+        # All profiles live in one document, so every cached copy is stale
+        self.clear_cache()
 
-        logger.info(f"Successfully synced profile: {profile_name or 'default'}")
+        logger.info("Successfully synced profile: %s", profile_name or "default")
@@ -0,0 +1,119 @@
+"""Shared fixtures and mock Nightscout payloads for the unit tests."""
+
+import json
+
+import pytest
+
+# Mock API payloads, built once per run. Tests must treat them as read-only:
+# they are shared by every test through the session-scoped fixtures below.
+
+MOCK_PROFILE_RESPONSE = [
+    {
+        "_id": "test-profile-id",
+        "defaultProfile": "Default",
+        "store": {
+            "Default": {
+                "dia": 5.0,
+                "carbratio": [{"time": "00:00", "value": 10.0, "timeAsSeconds": 0}],
+                "sens": [{"time": "00:00", "value": 50.0, "timeAsSeconds": 0}],
+                "basal": [{"time": "00:00", "value": 1.0, "timeAsSeconds": 0}],
+                "target_low": [
+                    {
+                        "time": "00:00",
+                        "value": 100.0,
+                        "low": 90.0,
+                        "high": 110.0,
+                        "timeAsSeconds": 0,
+                    }
+                ],
+                "target_high": [
+                    {
+                        "time": "00:00",
+                        "value": 120.0,
+                        "low": 110.0,
+                        "high": 130.0,
+                        "timeAsSeconds": 0,
+                    }
+                ],
+                "timezone": "UTC",
+                "units": "mg/dL",
+            }
+        },
+        "startDate": "2024-01-01T00:00:00Z",
+        "mills": 1704067200000,
+        "units": "mg/dL",
+        "created_at": "2024-01-01T00:00:00Z",
+    }
+]
+
+MOCK_ENTRIES_RESPONSE = [
+    {
+        "_id": "entry1",
+        "sgv": 120,
+        "date": 1704067200000,
+        "dateString": "2024-01-01T00:00:00Z",
+        "type": "sgv",
+        "direction": "Flat",
+        "device": "test-device",
+    },
+    {
+        "_id": "entry2",
+        "sgv": 130,
+        "date": 1704070800000,
+        "dateString": "2024-01-01T01:00:00Z",
+        "type": "sgv",
+        "direction": "FortyFiveUp",
+        "device": "test-device",
+    },
+]
+
+MOCK_TREATMENTS_RESPONSE = [
+    {
+        "_id": "treatment1",
+        "eventType": "Meal Bolus",
+        "created_at": "2024-01-01T00:00:00Z",
+        "timestamp": "2024-01-01T00:00:00Z",
+        "insulin": 5.0,
+        "carbs": 50.0,
+        "glucose": 120,
+        "glucoseType": "Finger",
+        "notes": "Test meal",
+        "enteredBy": "test-user",
+    }
+]
+
+
+@pytest.fixture(scope="session")
+def mock_profile_response():
+    """Fixture providing mock profile response data (read-only)."""
+    return MOCK_PROFILE_RESPONSE
+
+
+@pytest.fixture(scope="session")
+def mock_entries_response():
+    """Fixture providing mock entries response data (read-only)."""
+    return MOCK_ENTRIES_RESPONSE
+
+
+@pytest.fixture(scope="session")
+def mock_treatments_response():
+    """Fixture providing mock treatments response data (read-only)."""
+    return MOCK_TREATMENTS_RESPONSE
+
+
+@pytest.fixture(scope="session")
+def mock_profile_json(mock_profile_response):
+    """Fixture providing the mock profile response as a JSON body."""
+    return json.dumps(mock_profile_response).encode()
+
+
+@pytest.fixture(scope="session")
+def mock_entries_json(mock_entries_response):
+    """Fixture providing the mock entries response as a JSON body."""
+    return json.dumps(mock_entries_response).encode()
+
+
+@pytest.fixture(scope="session")
+def mock_treatments_json(mock_treatments_response):
+    """Fixture providing the mock treatments response as a JSON body."""
+    return json.dumps(mock_treatments_response).encode()
@@ -1,12 +1,19 @@
 """Unit tests for Autotune client."""
 
 import json
+import logging
 import subprocess
-from unittest.mock import Mock, patch
+import sys
+from unittest.mock import patch
 
 import pytest
 
-from app.clients.autotune_client import AutotuneClient
+from app.clients.autotune_client import AutotuneClient, _dump_bytes, _run_process
+
+# Result of a successful run; built once since the client never modifies it
+COMPLETED_PROCESS = subprocess.CompletedProcess(
+    ["oref0-autotune"], returncode=0, stdout=b"", stderr=b""
+)
 
 
 @pytest.fixture
@@ -62,6 +69,28 @@ def mock_autotune_result():
     }
 
 
+@pytest.fixture(scope="class")
+def mock_run():
+    """Fixture patching subprocess.run once per test class."""
+    with patch("subprocess.run") as mock:
+        yield mock
+
+
+@pytest.fixture
+def mock_tempdir(tmp_path):
+    """Fixture making tempfile.TemporaryDirectory use the test's tmp_path."""
+    with patch("tempfile.TemporaryDirectory") as mock:
+        mock.return_value.__enter__.return_value = str(tmp_path)
+        yield mock
+
+
+@pytest.fixture
+def reset_subprocess_mocks(mock_run):
+    """Fixture resetting the class-scoped subprocess patch after each test."""
+    yield
+    mock_run.reset_mock(return_value=True, side_effect=True)
+
+
 class TestAutotuneClientInit:
     """Tests for AutotuneClient initialization."""
 
@@ -77,20 +106,13 @@ class TestAutotuneClientInit:
         assert client.autotune_path == custom_path
 
 
+@pytest.mark.usefixtures("reset_subprocess_mocks", "mock_tempdir")
 class TestAutotuneClientRunAutotune:
     """Tests for run_autotune method."""
 
-    @patch("subprocess.run")
-    @patch("tempfile.TemporaryDirectory")
-    @patch("pathlib.Path.write_text")
-    @patch("pathlib.Path.read_text")
-    @patch("pathlib.Path.exists")
     def test_run_autotune_success(
         self,
-        mock_exists,
-        mock_read_text,
-        mock_write_text,
-        mock_tempdir,
+        tmp_path,
         mock_run,
         autotune_client,
         mock_profile_data,
@@ -99,16 +121,14 @@ class TestAutotuneClientRunAutotune:
         mock_autotune_result,
     ):
         """Test successful autotune execution."""
-        # Setup mocks
-        mock_tempdir.return_value.__enter__.return_value = "/tmp/test"
-        mock_exists.return_value = True
-        mock_read_text.return_value = json.dumps(mock_autotune_result)
+        recommendations = tmp_path / "autotune" / "autotune_recommendations.json"
 
-        mock_result = Mock()
-        mock_result.stdout = "Autotune completed"
-        mock_result.stderr = ""
-        mock_result.returncode = 0
-        mock_run.return_value = mock_result
+        def run(cmd, **kwargs):
+            # Stand in for autotune: write the recommendations it would produce
+            recommendations.write_text(json.dumps(mock_autotune_result))
+            return COMPLETED_PROCESS
+
+        mock_run.side_effect = run
 
         # Run autotune
         result = autotune_client.run_autotune(
@@ -128,11 +148,48 @@ class TestAutotuneClientRunAutotune:
         assert "--days" in call_args
         assert "7" in call_args
 
-    @patch("subprocess.run")
-    @patch("tempfile.TemporaryDirectory")
+        # Verify the input files autotune was pointed at
+        assert json.loads((tmp_path / "profile.json").read_bytes()) == (
+            mock_profile_data
+        )
+        assert json.loads((tmp_path / "entries.json").read_bytes()) == (
+            mock_entries_data
+        )
+        assert json.loads((tmp_path / "treatments.json").read_bytes()) == (
+            mock_treatments_data
+        )
+
+    @patch("pathlib.Path.mkdir")
+    @patch("app.clients.autotune_client._dump_bytes")
+    @patch("pathlib.Path.read_bytes")
+    @patch("pathlib.Path.exists")
+    def test_run_autotune_raw_writes_bytes_unchanged(
+        self,
+        mock_exists,
+        mock_read_bytes,
+        mock_dump_bytes,
+        mock_mkdir,
+        autotune_client,
+        mock_autotune_result,
+    ):
+        """Test that pre-serialized input is written without re-encoding."""
+        mock_exists.return_value = True
+        mock_read_bytes.return_value = json.dumps(mock_autotune_result).encode()
+        entries_bytes = b'[{"sgv":120,"date":1704067200000,"type":"sgv"}]'
+        treatments_bytes = b'[{"eventType":"Meal Bolus","carbs":50.0}]'
+
+        result = autotune_client.run_autotune_raw(
+            b'{"dia":5.0}', entries_bytes, treatments_bytes, days=7
+        )
+
+        written = [call.args[1] for call in mock_dump_bytes.call_args_list]
+        assert sorted(written) == sorted(
+            [b'{"dia":5.0}', entries_bytes, treatments_bytes]
+        )
+        assert result == mock_autotune_result
+
     def test_run_autotune_timeout(
         self,
-        mock_tempdir,
         mock_run,
         autotune_client,
         mock_profile_data,
@@ -140,7 +197,6 @@ class TestAutotuneClientRunAutotune:
         mock_treatments_data,
     ):
         """Test autotune execution timeout."""
-        mock_tempdir.return_value.__enter__.return_value = "/tmp/test"
         mock_run.side_effect = subprocess.TimeoutExpired("cmd", 600)
 
         with pytest.raises(ValueError, match="timed out"):
@@ -148,11 +204,8 @@ class TestAutotuneClientRunAutotune:
                 mock_profile_data, mock_entries_data, mock_treatments_data
             )
 
-    @patch("subprocess.run")
-    @patch("tempfile.TemporaryDirectory")
     def test_run_autotune_execution_failure(
         self,
-        mock_tempdir,
         mock_run,
         autotune_client,
         mock_profile_data,
@@ -160,14 +213,8 @@ class TestAutotuneClientRunAutotune:
         mock_treatments_data,
     ):
         """Test autotune execution failure."""
-        mock_tempdir.return_value.__enter__.return_value = "/tmp/test"
-
-        mock_result = Mock()
-        mock_result.returncode = 1
-        mock_result.stdout = ""
-        mock_result.stderr = "Error message"
         mock_run.side_effect = subprocess.CalledProcessError(
-            1, "cmd", output="", stderr="Error message"
+            1, "cmd", output=None, stderr=b"Error message"
         )
 
         with pytest.raises(subprocess.CalledProcessError):
@@ -175,13 +222,8 @@ class TestAutotuneClientRunAutotune:
                 mock_profile_data, mock_entries_data, mock_treatments_data
             )
 
-    @patch("subprocess.run")
-    @patch("tempfile.TemporaryDirectory")
-    @patch("pathlib.Path.exists")
     def test_run_autotune_no_output_file(
         self,
-        mock_exists,
-        mock_tempdir,
         mock_run,
         autotune_client,
         mock_profile_data,
@@ -189,14 +231,8 @@ class TestAutotuneClientRunAutotune:
         mock_treatments_data,
     ):
         """Test autotune when no recommendations file is produced."""
-        mock_tempdir.return_value.__enter__.return_value = "/tmp/test"
-        mock_exists.return_value = False  # Recommendations file doesn't exist
-
-        mock_result = Mock()
-        mock_result.stdout = "Completed"
-        mock_result.stderr = ""
-        mock_result.returncode = 0
-        mock_run.return_value = mock_result
+        # Autotune exits successfully without writing recommendations
+        mock_run.return_value = COMPLETED_PROCESS
 
         with pytest.raises(ValueError, match="did not produce recommendations"):
             autotune_client.run_autotune(
@@ -204,16 +240,84 @@ class TestAutotuneClientRunAutotune:
             )
 
 
+class TestDumpBytes:
+    """Tests for the _dump_bytes helper."""
+
+    def test_dump_bytes_writes_content(self, tmp_path):
+        """Test that the payload is written in full with owner-only access."""
+        path = tmp_path / "entries.json"
+        data = b"[" + b",".join([b'{"sgv":120}'] * 10000) + b"]"
+
+        _dump_bytes(path, data)
+
+        assert path.read_bytes() == data
+        assert path.stat().st_mode & 0o777 == 0o600
+
+    def test_dump_bytes_truncates_existing_file(self, tmp_path):
+        """Test that a longer existing file is fully replaced."""
+        path = tmp_path / "profile.json"
+        path.write_bytes(b'{"dia":5.0,"units":"mg/dL"}')
+
+        _dump_bytes(path, b"{}")
+
+        assert path.read_bytes() == b"{}"
+
+
+class TestRunProcess:
+    """Tests for the _run_process helper."""
+
+    def test_run_process_streams_output_to_debug_log(self, caplog):
+        """Test that stdout is forwarded line by line when debugging."""
+        caplog.set_level(logging.DEBUG, logger="app.clients.autotune_client")
+
+        _run_process([sys.executable, "-c", "print('line 1'); print('line 2')"], 10)
+
+        assert "Autotune: line 1" in caplog.messages
+        assert "Autotune: line 2" in caplog.messages
+
+    def test_run_process_logs_final_line_without_newline(self, caplog):
+        """Test that output not terminated by a newline is still logged."""
+        caplog.set_level(logging.DEBUG, logger="app.clients.autotune_client")
+        script = "import sys; sys.stdout.write('done')"
+
+        _run_process([sys.executable, "-c", script], 10)
+
+        assert "Autotune: done" in caplog.messages
+
+    def test_run_process_timeout_kills_process(self, caplog):
+        """Test that a process still running at the timeout is killed."""
+        caplog.set_level(logging.DEBUG, logger="app.clients.autotune_client")
+
+        with pytest.raises(subprocess.TimeoutExpired):
+            _run_process([sys.executable, "-c", "import time; time.sleep(30)"], 1)
+
+    def test_run_process_failure_keeps_stderr(self, caplog):
+        """Test that a non-zero exit raises with the captured stderr."""
+        caplog.set_level(logging.DEBUG, logger="app.clients.autotune_client")
+        script = "import sys; sys.stderr.write('boom\\n'); sys.exit(3)"
+
+        with pytest.raises(subprocess.CalledProcessError) as exc_info:
+            _run_process([sys.executable, "-c", script], 10)
+
+        assert exc_info.value.returncode == 3
+        assert exc_info.value.stderr == b"boom\n"
+
+    def test_run_process_discards_stdout_without_debug(self):
+        """Test that stdout is discarded when debug logging is off."""
+        with patch("subprocess.run") as mock_run:
+            _run_process(["autotune"], 10)
+
+        assert mock_run.call_args[1]["stdout"] == subprocess.DEVNULL
+
+
+@pytest.mark.usefixtures("reset_subprocess_mocks", "mock_tempdir")
 class TestAutotuneClientUploadProfile:
     """Tests for upload_profile method."""
 
-    @patch("subprocess.run")
-    @patch("tempfile.TemporaryDirectory")
     def test_upload_profile_not_implemented(
-        self, mock_tempdir, mock_run, autotune_client, mock_profile_data
+        self, mock_run, autotune_client, mock_profile_data
     ):
         """Test that upload raises NotImplementedError if tool not found."""
-        mock_tempdir.return_value.__enter__.return_value = "/tmp/test"
         mock_run.side_effect = FileNotFoundError()
 
         with pytest.raises(NotImplementedError, match="Use NightscoutClient"):
@@ -221,13 +325,10 @@ class TestAutotuneClientUploadProfile:
                 mock_profile_data, "https://test.com", "secret"
             )
 
-    @patch("subprocess.run")
-    @patch("tempfile.TemporaryDirectory")
     def test_upload_profile_execution_failure(
-        self, mock_tempdir, mock_run, autotune_client, mock_profile_data
+        self, tmp_path, mock_run, autotune_client, mock_profile_data
     ):
         """Test upload profile execution failure."""
-        mock_tempdir.return_value.__enter__.return_value = "/tmp/test"
         mock_run.side_effect = subprocess.CalledProcessError(
             1, "cmd", output="", stderr="Upload failed"
         )
@@ -236,3 +337,7 @@ class TestAutotuneClientUploadProfile:
             autotune_client.upload_profile(
                 mock_profile_data, "https://test.com", "secret"
             )
+
+        profile_file = tmp_path / "profile.json"
+        assert json.loads(profile_file.read_bytes()) == mock_profile_data
+        assert mock_run.call_args[0][0][1] == str(profile_file)
@@ -1,7 +1,8 @@
 """Unit tests for Autotune service."""
 
+import json
 from datetime import datetime
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock
 
 import pytest
 from pydantic import ValidationError
@@ -17,10 +18,11 @@ from app.services.autotune_service import AutotuneService
 
 
 @pytest.fixture
-def mock_autotune_client():
+def mock_autotune_client(monkeypatch):
     """Fixture providing a mocked Autotune client."""
-    with patch("app.services.autotune_service.AutotuneClient") as mock:
-        yield mock
+    mock = MagicMock()
+    monkeypatch.setattr("app.services.autotune_service.AutotuneClient", mock)
+    return mock
 
 
 @pytest.fixture
@@ -29,9 +31,9 @@ def autotune_service(mock_autotune_client):
     return AutotuneService("/usr/local/bin/oref0-autotune")
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_profile_store():
-    """Fixture providing a ProfileStore instance."""
+    """Fixture providing a ProfileStore instance, validated once (read-only)."""
     return ProfileStore(
         dia=5.0,
         carbratio=[{"time": "00:00", "value": 10.0, "timeAsSeconds": 0}],
@@ -152,25 +154,71 @@ class TestAutotuneServiceRunAnalysis:
         assert result.profile_name == "Default"
         assert result.days_analyzed == 7
 
-    def test_run_analysis_converts_models_to_dicts(
+    def test_run_analysis_serializes_models_for_client(
         self,
         autotune_service,
         mock_profile_store,
         mock_historical_data,
         mock_autotune_result,
     ):
-        """Test that Pydantic models are converted to dicts for client."""
+        """Test that Pydantic models are serialized for the client."""
         autotune_service.client.run_autotune = Mock(return_value=mock_autotune_result)
 
         autotune_service.run_analysis(
             mock_profile_store, mock_historical_data, "Default"
         )
 
-        # Verify run_autotune was called with dicts
+        # Profile is passed as dict, entries and treatments as JSON bytes
         call_args = autotune_service.client.run_autotune.call_args[0]
         assert isinstance(call_args[0], dict)  # profile_data
-        assert isinstance(call_args[1], list)  # entries_data
-        assert isinstance(call_args[2], list)  # treatments_data
+        assert isinstance(call_args[1], bytes)  # entries_data
+        assert isinstance(call_args[2], bytes)  # treatments_data
+
+        entries = json.loads(call_args[1])
+        assert [entry["sgv"] for entry in entries] == [120, 130]
+        assert entries[0]["_id"] == "entry1"
+        assert json.loads(call_args[2])[0]["insulin"] == 5.0
+
+    def test_run_analysis_raw_forwards_records_unchanged(
+        self,
+        autotune_service,
+        mock_profile_store,
+        mock_autotune_result,
+    ):
+        """Test that run_analysis_raw passes raw records straight to client."""
+        autotune_service.client.run_autotune = Mock(return_value=mock_autotune_result)
+        entries = [{"sgv": 120, "date": 1704067200000, "type": "sgv"}]
+        treatments = [{"eventType": "Meal Bolus", "carbs": 50.0}]
+
+        result = autotune_service.run_analysis_raw(
+            mock_profile_store, entries, treatments, "Default", days=3
+        )
+
+        call_args = autotune_service.client.run_autotune.call_args[0]
+        assert call_args[1] is entries
+        assert call_args[2] is treatments
+        assert call_args[3] == 3
+        assert isinstance(result, AutotuneRecommendations)
+        assert result.days_analyzed == 3
+
+    def test_run_analysis_raw_forwards_bytes_unchanged(
+        self,
+        autotune_service,
+        mock_profile_store,
+        mock_autotune_result,
+    ):
+        """Test that raw JSON response bodies are passed through as-is."""
+        autotune_service.client.run_autotune = Mock(return_value=mock_autotune_result)
+        entries = b'[{"sgv":120,"date":1704067200000,"type":"sgv"}]'
+        treatments = b"[]"
+
+        autotune_service.run_analysis_raw(
+            mock_profile_store, entries, treatments, "Default"
+        )
+
+        call_args = autotune_service.client.run_autotune.call_args[0]
+        assert call_args[1] is entries
+        assert call_args[2] is treatments
 
     def test_run_analysis_invalid_result_raises_validation_error(
         self, autotune_service, mock_profile_store, mock_historical_data
@@ -243,6 +291,8 @@ class TestAutotuneServiceApplyRecommendations:
 
         # Original should be unchanged
         assert mock_profile_store.carbratio[0].value == original_carb_ratio
+        assert mock_profile_store.sens[0].value == 50.0
+        assert mock_profile_store.basal[0].value == 1.0
         # Result should be updated
         assert result.carbratio[0].value == 15.0
 
@@ -271,6 +321,56 @@ class TestAutotuneServiceApplyRecommendations:
         assert result.basal[0].time == "06:30"
         assert result.basal[0].timeAsSeconds == 6 * 3600 + 30 * 60
 
+    def test_apply_recommendations_single_flat_rate(
+        self, autotune_service, mock_profile_store
+    ):
+        """Test that a single all-day basal rate becomes a midnight entry."""
+        recommendations = AutotuneRecommendations(
+            result=AutotuneResult(
+                basalprofile=[{"start": "00:00:00", "minutes": 1440, "rate": 0.9}],
+                carb_ratio=12.0,
+                sens=55.0,
+            ),
+            profile_name="Default",
+            analysis_date=datetime.now().isoformat(),
+            days_analyzed=7,
+        )
+
+        result = autotune_service.apply_recommendations(
+            mock_profile_store, recommendations
+        )
+
+        assert len(result.basal) == 1
+        assert result.basal[0].model_dump() == {
+            "time": "00:00",
+            "value": 0.9,
+            "timeAsSeconds": 0,
+        }
+
+    def test_apply_recommendations_converts_unaligned_time(
+        self, autotune_service, mock_profile_store
+    ):
+        """Test that basal times off the 30-minute grid are converted too."""
+        recommendations = AutotuneRecommendations(
+            result=AutotuneResult(
+                basalprofile=[
+                    {"start": "06:15:00", "minutes": 45, "rate": 1.3},
+                ],
+                carb_ratio=12.0,
+                sens=55.0,
+            ),
+            profile_name="Default",
+            analysis_date=datetime.now().isoformat(),
+            days_analyzed=7,
+        )
+
+        result = autotune_service.apply_recommendations(
+            mock_profile_store, recommendations
+        )
+
+        assert result.basal[0].time == "06:15"
+        assert result.basal[0].timeAsSeconds == 6 * 3600 + 15 * 60
+
     def test_apply_recommendations_without_dia(
         self, autotune_service, mock_profile_store
     ):
@@ -0,0 +1,51 @@
+"""Unit tests for time-of-day conversions."""
+
+import pytest
+
+from app.services._fast_time import format_hhmm, parse_start_time, to_seconds
+
+
+class TestToSeconds:
+    """Tests for to_seconds."""
+
+    def test_to_seconds(self):
+        """Test conversion of hours and minutes to seconds from midnight."""
+        assert to_seconds(0, 0) == 0
+        assert to_seconds(6, 15) == 22500
+        assert to_seconds(23, 59) == 86340
+
+
+class TestFormatHhmm:
+    """Tests for format_hhmm."""
+
+    def test_format_hhmm_pads_fields(self):
+        """Test that hours and minutes are zero-padded."""
+        assert format_hhmm(0) == "00:00"
+        assert format_hhmm(22500) == "06:15"
+        assert format_hhmm(86340) == "23:59"
+
+
+class TestParseStartTime:
+    """Tests for parse_start_time."""
+
+    def test_parse_start_time_half_hour_slot(self):
+        """Test a start time on a 30-minute boundary."""
+        assert parse_start_time("13:30:00") == ("13:30", 48600)
+
+    def test_parse_start_time_unaligned(self):
+        """Test a start time that is not on a 30-minute boundary."""
+        assert parse_start_time("06:15:00") == ("06:15", 22500)
+
+    def test_parse_start_time_last_minute(self):
+        """Test the latest possible start time."""
+        assert parse_start_time("23:59:00") == ("23:59", 86340)
+
+    def test_parse_start_time_single_digit_hour(self):
+        """Test a start time without a leading zero."""
+        assert parse_start_time("6:30:00") == ("6:30", 23400)
+
+    @pytest.mark.parametrize("start", ["06-15-00", "ab:cd:00"])
+    def test_parse_start_time_invalid_raises_error(self, start):
+        """Test that malformed start times are rejected."""
+        with pytest.raises(ValueError):
+            parse_start_time(start)
@@ -1,139 +1,105 @@
 """Unit tests for Nightscout client."""
 
-from datetime import datetime
-from unittest.mock import Mock, patch
+import json
+import re
+from datetime import UTC, datetime
 
 import pytest
 import requests
+import responses
+from pydantic import ValidationError
 
 from app.clients.nightscout_client import NightscoutClient
+from app.models.nightscout import NightscoutProfile
 
+BASE_URL = "https://test.nightscout.com"
+PROFILE_URL = f"{BASE_URL}/api/v1/profile"
+ENTRIES_URL = f"{BASE_URL}/api/v1/entries"
+TREATMENTS_URL = f"{BASE_URL}/api/v1/treatments"
 
-@pytest.fixture
+# Raised by stubbed routes; no test inspects the instance, so one is shared
+HTTP_ERROR = requests.HTTPError("API error")
+
+HTTPS_REQUIRED = re.compile("must use HTTPS")
+PROFILE_NOT_FOUND = re.compile("Profile 'NonExistent' not found")
+
+
+@pytest.fixture(scope="session")
 def nightscout_client():
-    """Fixture providing a Nightscout client instance."""
-    return NightscoutClient("https://test.nightscout.com", "test-secret")
-
-
-@pytest.fixture
-def mock_profile_response():
-    """Fixture providing mock profile response data."""
-    return [
-        {
-            "_id": "test-profile-id",
-            "defaultProfile": "Default",
-            "store": {
-                "Default": {
-                    "dia": 5.0,
-                    "carbratio": [{"time": "00:00", "value": 10.0, "timeAsSeconds": 0}],
-                    "sens": [{"time": "00:00", "value": 50.0, "timeAsSeconds": 0}],
-                    "basal": [{"time": "00:00", "value": 1.0, "timeAsSeconds": 0}],
-                    "target_low": [
-                        {
-                            "time": "00:00",
-                            "value": 100.0,
-                            "low": 90.0,
-                            "high": 110.0,
-                            "timeAsSeconds": 0,
-                        }
-                    ],
-                    "target_high": [
-                        {
-                            "time": "00:00",
-                            "value": 120.0,
-                            "low": 110.0,
-                            "high": 130.0,
-                            "timeAsSeconds": 0,
-                        }
-                    ],
-                    "timezone": "UTC",
-                    "units": "mg/dL",
-                }
-            },
-            "startDate": "2024-01-01T00:00:00Z",
-            "mills": 1704067200000,
-            "units": "mg/dL",
-            "created_at": "2024-01-01T00:00:00Z",
-        }
-    ]
-
-
-@pytest.fixture
-def mock_entries_response():
-    """Fixture providing mock entries response data."""
-    return [
-        {
-            "_id": "entry1",
-            "sgv": 120,
-            "date": 1704067200000,
-            "dateString": "2024-01-01T00:00:00Z",
-            "type": "sgv",
-            "direction": "Flat",
-            "device": "test-device",
-        },
-        {
-            "_id": "entry2",
-            "sgv": 130,
-            "date": 1704070800000,
-            "dateString": "2024-01-01T01:00:00Z",
-            "type": "sgv",
-            "direction": "FortyFiveUp",
-            "device": "test-device",
-        },
-    ]
-
-
-@pytest.fixture
-def mock_treatments_response():
-    """Fixture providing mock treatments response data."""
-    return [
-        {
-            "_id": "treatment1",
-            "eventType": "Meal Bolus",
-            "created_at": "2024-01-01T00:00:00Z",
-            "timestamp": "2024-01-01T00:00:00Z",
-            "insulin": 5.0,
-            "carbs": 50.0,
-            "glucose": 120,
-            "glucoseType": "Finger",
-            "notes": "Test meal",
-            "enteredBy": "test-user",
-        }
-    ]
+    """Fixture providing a Nightscout client instance shared by all tests."""
+    # Requests are intercepted at the transport adapter (see mocked_http), so
+    # the session the client creates on first use never reaches the network
+    return NightscoutClient(BASE_URL, "test-secret")
+
+
+@pytest.fixture(autouse=True)
+def mocked_http(mock_profile_json, mock_entries_json, mock_treatments_json):
+    """Fixture stubbing the Nightscout API; tests override routes with replace()."""
+    # Bodies are serialized once per run instead of on every registration
+    json_type = "application/json"
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        rsps.add(
+            responses.GET, PROFILE_URL, body=mock_profile_json, content_type=json_type
+        )
+        rsps.add(
+            responses.GET, ENTRIES_URL, body=mock_entries_json, content_type=json_type
+        )
+        rsps.add(
+            responses.GET,
+            TREATMENTS_URL,
+            body=mock_treatments_json,
+            content_type=json_type,
+        )
+        rsps.add(responses.POST, PROFILE_URL, json={"ok": True})
+        yield rsps
 
 
 class TestNightscoutClientInit:
     """Tests for NightscoutClient initialization."""
 
-    def test_init_with_https_url(self):
-        """Test that client initializes successfully with HTTPS URL."""
-        client = NightscoutClient("https://test.nightscout.com", "secret")
-        assert client.url == "https://test.nightscout.com"
+    @pytest.mark.parametrize(
+        ("url", "expected_url", "raises"),
+        [
+            (BASE_URL, BASE_URL, None),
+            (f"{BASE_URL}/", BASE_URL, None),
+            ("http://test.nightscout.com", None, ValueError),
+        ],
+        ids=["https", "trailing-slash", "http-rejected"],
+    )
+    def test_validate_url(self, url, expected_url, raises):
+        """Test URL normalization and HTTPS enforcement without a client."""
+        if raises is not None:
+            with pytest.raises(raises, match=HTTPS_REQUIRED):
+                NightscoutClient._validate_url(url)
+            return
+
+        assert NightscoutClient._validate_url(url) == expected_url
+
+    @pytest.mark.parametrize(
+        ("args", "expected_timeout"),
+        [((), 30), ((60,), 60)],
+        ids=["default-timeout", "custom-timeout"],
+    )
+    def test_init(self, args, expected_timeout):
+        """Test positional construction with a normalized URL."""
+        client = NightscoutClient(f"{BASE_URL}/", "secret", *args)
+
+        assert client.url == BASE_URL
         assert client.api_secret == "secret"
-        assert client.timeout == 30
-
-    def test_init_strips_trailing_slash(self):
-        """Test that trailing slash is removed from URL."""
-        client = NightscoutClient("https://test.nightscout.com/", "secret")
-        assert client.url == "https://test.nightscout.com"
+        assert client.timeout == expected_timeout
 
     def test_init_with_http_url_raises_error(self):
-        """Test that HTTP URLs are rejected."""
-        with pytest.raises(ValueError, match="must use HTTPS"):
+        """Test that HTTP URLs are rejected on construction."""
+        with pytest.raises(ValueError, match=HTTPS_REQUIRED):
             NightscoutClient("http://test.nightscout.com", "secret")
 
-    def test_init_with_custom_timeout(self):
-        """Test that custom timeout is set correctly."""
-        client = NightscoutClient("https://test.nightscout.com", "secret", timeout=60)
-        assert client.timeout == 60
-
 
 class TestNightscoutClientAuth:
     """Tests for authentication header generation."""
 
     def test_get_auth_headers(self, nightscout_client):
         """Test that authentication headers are generated correctly."""
-        headers = nightscout_client._get_auth_headers()
+        headers = nightscout_client._auth_headers
 
         assert "API-SECRET" in headers
         assert "Content-Type" in headers
@@ -143,86 +109,87 @@ class TestNightscoutClientAuth:
         # API-SECRET should be SHA1 hash of the secret
         assert len(headers["API-SECRET"]) == 40  # SHA1 hash length
 
+    def test_session_sends_auth_headers(self, nightscout_client, mocked_http):
+        """Test that requests carry the headers attached to the session."""
+        nightscout_client.get_profile("Default")
 
-class TestNightscoutClientGetProfile:
-    """Tests for get_profile method."""
+        request_headers = mocked_http.calls[-1].request.headers
+        api_secret = nightscout_client._auth_headers["API-SECRET"]
+        assert request_headers["API-SECRET"] == api_secret
 
-    @patch("requests.Session.get")
-    def test_get_profile_success(
-        self, mock_get, nightscout_client, mock_profile_response
-    ):
-        """Test successful profile retrieval."""
-        mock_response = Mock()
-        mock_response.json.return_value = mock_profile_response
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
 
-        result = nightscout_client.get_profile()
+class TestNightscoutClientGetProfiles:
+    """Tests for get_profiles method."""
 
-        assert result == mock_profile_response[0]
-        assert result["defaultProfile"] == "Default"
-        assert "Default" in result["store"]
+    def test_get_profiles_success(self, nightscout_client, mock_profile_response):
+        """Test that the whole profile document is returned validated."""
+        result = nightscout_client.get_profiles()
 
-    @patch("requests.Session.get")
-    def test_get_profile_with_name(
-        self, mock_get, nightscout_client, mock_profile_response
+        assert isinstance(result, NightscoutProfile)
+        assert result.model_dump(by_alias=True) == mock_profile_response[0]
+
+    def test_get_profiles_invalid_data_raises_validation_error(
+        self, nightscout_client, mocked_http
     ):
-        """Test profile retrieval with specific profile name."""
-        mock_response = Mock()
-        mock_response.json.return_value = mock_profile_response
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
+        """Test that an invalid profile document raises ValidationError."""
+        mocked_http.replace(responses.GET, PROFILE_URL, json=[{"invalid": "data"}])
+
+        with pytest.raises(ValidationError):
+            nightscout_client.get_profiles()
 
+
+class TestNightscoutClientGetProfile:
+    """Tests for get_profile method."""
+
+    def test_get_profile_success(self, nightscout_client, mock_profile_response):
+        """Test that the named profile is returned as a validated store entry."""
         result = nightscout_client.get_profile("Default")
 
-        assert "Default" in result["store"]
+        assert result.model_dump() == mock_profile_response[0]["store"]["Default"]
 
-    @patch("requests.Session.get")
-    def test_get_profile_nonexistent_name_raises_error(
-        self, mock_get, nightscout_client, mock_profile_response
+    def test_get_profile_with_name(
+        self, nightscout_client, mocked_http, mock_profile_response
     ):
-        """Test that requesting nonexistent profile raises ValueError."""
-        mock_response = Mock()
-        mock_response.json.return_value = mock_profile_response
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
+        """Test that a profile other than the default can be loaded."""
+        document = dict(mock_profile_response[0])
+        night = dict(document["store"]["Default"], dia=6.0)
+        document["store"] = {"Default": document["store"]["Default"], "Night": night}
+        mocked_http.replace(responses.GET, PROFILE_URL, json=[document])
+
+        result = nightscout_client.get_profile("Night")
 
-        with pytest.raises(ValueError, match="Profile 'NonExistent' not found"):
+        assert result.dia == 6.0
+
+    def test_get_profile_nonexistent_name_raises_error(self, nightscout_client):
+        """Test that requesting nonexistent profile raises ValueError."""
+        with pytest.raises(ValueError, match=PROFILE_NOT_FOUND):
             nightscout_client.get_profile("NonExistent")
 
-    @patch("requests.Session.get")
-    def test_get_profile_empty_response_raises_error(self, mock_get, nightscout_client):
+    def test_get_profile_empty_response_raises_error(
+        self, nightscout_client, mocked_http
+    ):
         """Test that empty profile response raises ValueError."""
-        mock_response = Mock()
-        mock_response.json.return_value = []
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
+        mocked_http.replace(responses.GET, PROFILE_URL, json=[])
 
         with pytest.raises(ValueError, match="No profiles found"):
-            nightscout_client.get_profile()
+            nightscout_client.get_profile("Default")
 
-    @patch("requests.Session.get")
-    def test_get_profile_http_error(self, mock_get, nightscout_client):
+    def test_get_profile_http_error(self, nightscout_client, mocked_http):
         """Test that HTTP errors are propagated."""
-        mock_get.side_effect = requests.HTTPError("API error")
+        mocked_http.replace(responses.GET, PROFILE_URL, body=HTTP_ERROR)
+
+        with pytest.raises(requests.HTTPError) as exc_info:
+            nightscout_client.get_profile("Default")
 
-        with pytest.raises(requests.HTTPError):
-            nightscout_client.get_profile()
+        assert exc_info.value is HTTP_ERROR
+        assert len(mocked_http.calls) == 1
 
 
 class TestNightscoutClientGetEntries:
     """Tests for get_entries method."""
 
-    @patch("requests.Session.get")
-    def test_get_entries_success(
-        self, mock_get, nightscout_client, mock_entries_response
-    ):
+    def test_get_entries_success(self, nightscout_client):
         """Test successful entries retrieval."""
-        mock_response = Mock()
-        mock_response.json.return_value = mock_entries_response
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
-
         start_date = datetime(2024, 1, 1)
         end_date = datetime(2024, 1, 2)
 
@@ -232,39 +199,49 @@ class TestNightscoutClientGetEntries:
         assert result[0]["sgv"] == 120
         assert result[1]["sgv"] == 130
 
-    @patch("requests.Session.get")
-    def test_get_entries_with_custom_count(
-        self, mock_get, nightscout_client, mock_entries_response
-    ):
+    def test_get_entries_with_custom_count(self, nightscout_client, mocked_http):
         """Test entries retrieval with custom count."""
-        mock_response = Mock()
-        mock_response.json.return_value = mock_entries_response
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
-
         start_date = datetime(2024, 1, 1)
         end_date = datetime(2024, 1, 2)
 
         nightscout_client.get_entries(start_date, end_date, count=50)
 
         # Verify count parameter was passed
-        call_kwargs = mock_get.call_args[1]
-        assert call_kwargs["params"]["count"] == 50
+        assert mocked_http.calls[-1].request.params["count"] == "50"
+
+    def test_get_entries_queries_epoch_milliseconds(
+        self, nightscout_client, mocked_http
+    ):
+        """Test that entries are selected on their epoch millisecond date."""
+        nightscout_client.get_entries(
+            datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 2, tzinfo=UTC)
+        )
+
+        params = mocked_http.calls[-1].request.params
+        assert params["find[date][$gte]"] == "1704067200000"
+        assert params["find[date][$lte]"] == "1704153600000"
+
+    def test_get_entries_requests_all_fields(self, nightscout_client, mocked_http):
+        """Test that full records are requested unless asked otherwise."""
+        nightscout_client.get_entries(datetime(2024, 1, 1), datetime(2024, 1, 2))
+
+        assert "fields" not in mocked_http.calls[-1].request.params
+
+    def test_get_entries_raw_autotune_fields(self, nightscout_client, mocked_http):
+        """Test that the autotune projection is sent when requested."""
+        nightscout_client.get_entries_raw(
+            datetime(2024, 1, 1), datetime(2024, 1, 2), autotune_fields=True
+        )
+
+        fields = mocked_http.calls[-1].request.params["fields"]
+        assert fields == "date,dateString,sgv,type"
 
 
 class TestNightscoutClientGetTreatments:
     """Tests for get_treatments method."""
 
-    @patch("requests.Session.get")
-    def test_get_treatments_success(
-        self, mock_get, nightscout_client, mock_treatments_response
-    ):
+    def test_get_treatments_success(self, nightscout_client):
         """Test successful treatments retrieval."""
-        mock_response = Mock()
-        mock_response.json.return_value = mock_treatments_response
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
-
         start_date = datetime(2024, 1, 1)
         end_date = datetime(2024, 1, 2)
 
@@ -274,56 +251,51 @@ class TestNightscoutClientGetTreatments:
         assert result[0]["insulin"] == 5.0
         assert result[0]["carbs"] == 50.0
 
+    def test_get_treatments_queries_utc_timestamps(
+        self, nightscout_client, mocked_http
+    ):
+        """Test that treatments are selected on UTC created_at strings."""
+        nightscout_client.get_treatments(
+            datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 2, tzinfo=UTC)
+        )
+
+        params = mocked_http.calls[-1].request.params
+        assert params["find[created_at][$gte]"] == "2024-01-01T00:00:00.000Z"
+        assert params["find[created_at][$lte]"] == "2024-01-02T00:00:00.000Z"
+
 
 class TestNightscoutClientGetHistoricalData:
     """Tests for get_historical_data method."""
 
-    @patch("requests.Session.get")
-    def test_get_historical_data_success(
-        self,
-        mock_get,
-        nightscout_client,
-        mock_entries_response,
-        mock_treatments_response,
-    ):
+    def test_get_historical_data_success(self, nightscout_client, mocked_http):
         """Test successful historical data retrieval."""
-        mock_response = Mock()
-        # Alternate responses for entries and treatments calls
-        mock_response.json.side_effect = [
-            mock_entries_response,
-            mock_treatments_response,
-        ]
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
-
         entries, treatments = nightscout_client.get_historical_data(days=7)
 
         assert len(entries) == 2
         assert len(treatments) == 1
-        assert mock_get.call_count == 2
+        assert len(mocked_http.calls) == 2
+
+    def test_get_historical_data_raw_uses_given_end_date(
+        self, nightscout_client, mocked_http
+    ):
+        """Test that the fetched window ends at the given end date."""
+        end_date = datetime(2024, 1, 8, tzinfo=UTC)
+
+        nightscout_client.get_historical_data_raw(days=7, end_date=end_date)
+
+        by_path = {
+            call.request.path_url.split("?")[0]: call for call in mocked_http.calls
+        }
+        entries_params = by_path["/api/v1/entries"].request.params
+        assert entries_params["find[date][$gte]"] == "1704067200000"
+        assert entries_params["find[date][$lte]"] == "1704672000000"
 
 
 class TestNightscoutClientUpdateProfile:
     """Tests for update_profile method."""
 
-    @patch("requests.Session.post")
-    @patch("requests.Session.get")
-    def test_update_profile_success(
-        self, mock_get, mock_post, nightscout_client, mock_profile_response
-    ):
+    def test_update_profile_success(self, nightscout_client, mocked_http):
         """Test successful profile update."""
-        # Mock GET response (to fetch current profile)
-        mock_get_response = Mock()
-        mock_get_response.json.return_value = mock_profile_response
-        mock_get_response.status_code = 200
-        mock_get.return_value = mock_get_response
-
-        # Mock POST response
-        mock_post_response = Mock()
-        mock_post_response.json.return_value = {"ok": True}
-        mock_post_response.status_code = 200
-        mock_post.return_value = mock_post_response
-
         new_profile_data = {
             "dia": 6.0,
             "carbratio": [{"time": "00:00", "value": 12.0, "timeAsSeconds": 0}],
@@ -354,23 +326,33 @@ class TestNightscoutClientUpdateProfile:
         result = nightscout_client.update_profile(new_profile_data, "Default")
 
         assert result == {"ok": True}
-        assert mock_get.call_count == 1
-        assert mock_post.call_count == 1
+        methods = [call.request.method for call in mocked_http.calls]
+        assert methods == ["GET", "POST"]
 
-    @patch("requests.Session.get")
-    def test_update_profile_no_default_raises_error(self, mock_get, nightscout_client):
+    def test_update_profile_raw_embeds_bytes(self, nightscout_client, mocked_http):
+        """Test that a pre-serialized store entry is posted in the document."""
+        result = nightscout_client.update_profile_raw(b'{"dia":6.0}', "Default")
+
+        posted = json.loads(mocked_http.calls[-1].request.body)
+        assert posted["store"]["Default"] == {"dia": 6.0}
+        assert result == {"ok": True}
+
+    def test_update_profile_no_default_raises_error(
+        self, nightscout_client, mocked_http
+    ):
         """Test that missing default profile raises ValueError."""
-        mock_response = Mock()
-        mock_response.json.return_value = [
-            {
-                "_id": "test-id",
-                "store": {},
-                "mills": 1234567890,
-                "created_at": "2024-01-01T00:00:00Z",
-            }
-        ]
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
+        mocked_http.replace(
+            responses.GET,
+            PROFILE_URL,
+            json=[
+                {
+                    "_id": "test-id",
+                    "store": {},
+                    "mills": 1234567890,
+                    "created_at": "2024-01-01T00:00:00Z",
+                }
+            ],
+        )
 
         with pytest.raises(ValueError, match="No profile name specified"):
             nightscout_client.update_profile({})
@@ -1,19 +1,40 @@
 """Unit tests for Nightscout service."""
 
-from unittest.mock import Mock, patch
+import json
+from datetime import UTC, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+import responses
 from pydantic import ValidationError
 
+from app.clients.nightscout_client import NightscoutClient
 from app.models.nightscout import HistoricalData, NightscoutProfile, ProfileStore
 from app.services.nightscout_service import NightscoutService
 
+VALID_ENTRY = {
+    "_id": "entry1",
+    "sgv": 120,
+    "date": 1704067200000,
+    "dateString": "2024-01-01T00:00:00Z",
+    "type": "sgv",
+}
+INVALID_ENTRY = {"invalid": "data"}
+
+
+def _const(value):
+    """Build a stub returning value, for calls the test never inspects."""
+    return lambda *args, **kwargs: value
+
 
 @pytest.fixture
-def mock_nightscout_client():
+def mock_nightscout_client(monkeypatch):
     """Fixture providing a mocked Nightscout client."""
-    with patch("app.services.nightscout_service.NightscoutClient") as mock:
-        yield mock
+    mock = MagicMock()
+    # Spec the instance on the real client, so stubbing a method it lacks fails
+    mock.return_value = MagicMock(spec=NightscoutClient)
+    monkeypatch.setattr("app.services.nightscout_service.NightscoutClient", mock)
+    return mock
 
 
 @pytest.fixture
@@ -22,80 +43,40 @@ def nightscout_service(mock_nightscout_client):
     return NightscoutService("https://test.nightscout.com", "test-secret")
 
 
-@pytest.fixture
-def mock_profile_data():
-    """Fixture providing valid profile data."""
-    return {
-        "_id": "test-id",
-        "defaultProfile": "Default",
-        "store": {
-            "Default": {
-                "dia": 5.0,
-                "carbratio": [{"time": "00:00", "value": 10.0, "timeAsSeconds": 0}],
-                "sens": [{"time": "00:00", "value": 50.0, "timeAsSeconds": 0}],
-                "basal": [{"time": "00:00", "value": 1.0, "timeAsSeconds": 0}],
-                "target_low": [
-                    {
-                        "time": "00:00",
-                        "value": 100.0,
-                        "low": 90.0,
-                        "high": 110.0,
-                        "timeAsSeconds": 0,
-                    }
-                ],
-                "target_high": [
-                    {
-                        "time": "00:00",
-                        "value": 120.0,
-                        "low": 110.0,
-                        "high": 130.0,
-                        "timeAsSeconds": 0,
-                    }
-                ],
-                "timezone": "UTC",
-                "units": "mg/dL",
-            }
-        },
-        "startDate": "2024-01-01T00:00:00Z",
-        "mills": 1704067200000,
-        "units": "mg/dL",
-        "created_at": "2024-01-01T00:00:00Z",
-    }
+@pytest.fixture(scope="session")
+def mock_profile_data(mock_profile_response):
+    """Fixture providing valid profile data (read-only)."""
+    return mock_profile_response[0]
 
 
-@pytest.fixture
-def mock_entries_data():
-    """Fixture providing valid entries data."""
-    return [
-        {
-            "_id": "entry1",
-            "sgv": 120,
-            "date": 1704067200000,
-            "dateString": "2024-01-01T00:00:00Z",
-            "type": "sgv",
-        },
-        {
-            "_id": "entry2",
-            "sgv": 130,
-            "date": 1704070800000,
-            "dateString": "2024-01-01T01:00:00Z",
-            "type": "sgv",
-        },
-    ]
+@pytest.fixture(scope="session")
+def mock_store_data(mock_profile_data):
+    """Fixture providing the raw Default store entry (read-only)."""
+    return mock_profile_data["store"]["Default"]
 
 
-@pytest.fixture
-def mock_treatments_data():
-    """Fixture providing valid treatments data."""
-    return [
-        {
-            "_id": "treatment1",
-            "eventType": "Meal Bolus",
-            "created_at": "2024-01-01T00:00:00Z",
-            "insulin": 5.0,
-            "carbs": 50.0,
-        }
-    ]
+@pytest.fixture(scope="session")
+def mock_profile(mock_profile_data):
+    """Fixture providing the mock profile, validated once per run (read-only)."""
+    return NightscoutProfile(**mock_profile_data)
+
+
+@pytest.fixture(scope="session")
+def mock_profile_store(mock_profile):
+    """Fixture providing the validated Default store entry (read-only)."""
+    return mock_profile.store["Default"]
+
+
+@pytest.fixture(scope="session")
+def mock_entries_data(mock_entries_response):
+    """Fixture providing valid entries data (read-only)."""
+    return mock_entries_response
+
+
+@pytest.fixture(scope="session")
+def mock_treatments_data(mock_treatments_response):
+    """Fixture providing valid treatments data (read-only)."""
+    return mock_treatments_response
 
 
 class TestNightscoutServiceInit:
@@ -112,10 +93,10 @@ class TestNightscoutServiceGetProfile:
     """Tests for get_profile method."""
 
     def test_get_profile_returns_validated_model(
-        self, nightscout_service, mock_profile_data
+        self, nightscout_service, mock_profile
     ):
         """Test that get_profile returns validated NightscoutProfile."""
-        nightscout_service.client.get_profile = Mock(return_value=mock_profile_data)
+        nightscout_service.client.get_profiles = _const(mock_profile)
 
         result = nightscout_service.get_profile()
 
@@ -123,32 +104,96 @@ class TestNightscoutServiceGetProfile:
         assert result.defaultProfile == "Default"
         assert "Default" in result.store
 
-    def test_get_profile_with_name(self, nightscout_service, mock_profile_data):
+    def test_get_profile_with_name(self, nightscout_service, mock_profile):
         """Test get_profile with specific profile name."""
-        nightscout_service.client.get_profile = Mock(return_value=mock_profile_data)
+        nightscout_service.client.get_profiles.return_value = mock_profile
 
         result = nightscout_service.get_profile("Default")
 
-        nightscout_service.client.get_profile.assert_called_once_with("Default")
+        nightscout_service.client.get_profiles.assert_called_once_with()
         assert isinstance(result, NightscoutProfile)
 
-    def test_get_profile_invalid_data_raises_validation_error(self, nightscout_service):
-        """Test that invalid profile data raises ValidationError."""
-        invalid_data = {"invalid": "data"}
-        nightscout_service.client.get_profile = Mock(return_value=invalid_data)
+    def test_get_profile_nonexistent_raises_error(
+        self, nightscout_service, mock_profile
+    ):
+        """Test that requesting a profile missing from the store fails."""
+        nightscout_service.client.get_profiles = _const(mock_profile)
 
-        with pytest.raises(ValidationError):
+        with pytest.raises(ValueError, match="not found in store"):
+            nightscout_service.get_profile("NonExistent")
+
+
+class TestNightscoutServiceProfileCache:
+    """Tests for the profile cache."""
+
+    def test_get_profile_reuses_cached_profile(self, nightscout_service, mock_profile):
+        """Test that repeated calls within the TTL fetch the profiles once."""
+        nightscout_service.client.get_profiles.return_value = mock_profile
+
+        first = nightscout_service.get_profile("Default")
+        second = nightscout_service.get_profile()
+
+        assert first == second
+        nightscout_service.client.get_profiles.assert_called_once_with()
+
+    def test_get_profile_returns_copy_of_cached_profile(
+        self, nightscout_service, mock_profile
+    ):
+        """Test that changing a returned profile leaves the cached one intact."""
+        nightscout_service.client.get_profiles.return_value = mock_profile
+
+        first = nightscout_service.get_profile("Default")
+        first.store["Default"].dia = 3.0
+        second = nightscout_service.get_profile("Default")
+
+        assert first is not second
+        assert second.store["Default"].dia == 5.0
+
+    def test_get_profile_refetches_after_ttl(self, nightscout_service, mock_profile):
+        """Test that expired profiles are fetched again."""
+        nightscout_service.client.get_profiles.return_value = mock_profile
+
+        with patch("app.services.nightscout_service.time.monotonic") as mock_time:
+            mock_time.return_value = 1000.0
             nightscout_service.get_profile()
+            mock_time.return_value = 1061.0
+            nightscout_service.get_profile()
+
+        assert nightscout_service.client.get_profiles.call_count == 2
+
+    def test_get_profile_store_shares_cached_profiles(
+        self, nightscout_service, mock_profile
+    ):
+        """Test that lookups of any profile share one fetched document."""
+        nightscout_service.client.get_profiles.return_value = mock_profile
+
+        nightscout_service.get_profile_store("Default")
+        nightscout_service.get_profile_store("Default")
+        nightscout_service.get_profile()
+
+        nightscout_service.client.get_profiles.assert_called_once_with()
+
+    def test_sync_profile_clears_cache(
+        self, nightscout_service, mock_profile, mock_profile_store
+    ):
+        """Test that syncing a profile invalidates cached profiles."""
+        nightscout_service.client.get_profiles.return_value = mock_profile
+
+        nightscout_service.get_profile_store("Default")
+        nightscout_service.sync_profile(mock_profile_store, "Default")
+        nightscout_service.get_profile_store("Default")
+
+        assert nightscout_service.client.get_profiles.call_count == 2
 
 
 class TestNightscoutServiceGetProfileStore:
     """Tests for get_profile_store method."""
 
     def test_get_profile_store_returns_validated_model(
-        self, nightscout_service, mock_profile_data
+        self, nightscout_service, mock_profile
     ):
         """Test that get_profile_store returns validated ProfileStore."""
-        nightscout_service.client.get_profile = Mock(return_value=mock_profile_data)
+        nightscout_service.client.get_profiles = _const(mock_profile)
 
         result = nightscout_service.get_profile_store("Default")
 
@@ -156,93 +201,229 @@ class TestNightscoutServiceGetProfileStore:
         assert result.dia == 5.0
         assert len(result.basal) == 1
 
+    def test_get_profile_store_returns_copy(self, nightscout_service, mock_profile):
+        """Test that changing a returned store entry leaves the cache intact."""
+        nightscout_service.client.get_profiles.return_value = mock_profile
+
+        result = nightscout_service.get_profile_store("Default")
+        result.basal[0].value = 9.9
+
+        assert nightscout_service.get_profile("Default").store["Default"] != result
+        assert mock_profile.store["Default"].basal[0].value == 1.0
+
     def test_get_profile_store_nonexistent_raises_error(
-        self, nightscout_service, mock_profile_data
+        self, nightscout_service, mock_profile
     ):
         """Test that requesting nonexistent profile raises ValueError."""
-        nightscout_service.client.get_profile = Mock(return_value=mock_profile_data)
+        nightscout_service.client.get_profiles = _const(mock_profile)
 
         with pytest.raises(ValueError, match="not found in store"):
             nightscout_service.get_profile_store("NonExistent")
 
 
+class TestNightscoutServiceWithClient:
+    """Tests running the service against the real client with stubbed HTTP."""
+
+    def test_profiles_are_fetched_once_through_client(self, mock_profile_json):
+        """Test that profile and store lookups share one profile request."""
+        with responses.RequestsMock() as rsps:
+            rsps.add(
+                responses.GET,
+                "https://test.nightscout.com/api/v1/profile",
+                body=mock_profile_json,
+                content_type="application/json",
+            )
+            service = NightscoutService("https://test.nightscout.com", "test-secret")
+
+            store = service.get_profile_store("Default")
+            profile = service.get_profile("Default")
+
+            assert len(rsps.calls) == 1
+
+        assert store.dia == 5.0
+        assert profile.defaultProfile == "Default"
+
+
 class TestNightscoutServiceGetHistoricalData:
     """Tests for get_historical_data method."""
 
+    @pytest.mark.parametrize(
+        ("days", "entries", "treatments", "expected_entries", "expected_treatments"),
+        [
+            (7, None, None, 2, 1),
+            (14, None, None, 2, 1),
+            (7, [VALID_ENTRY, INVALID_ENTRY], [], 1, 0),
+        ],
+        ids=["default-days", "custom-days", "invalid-entry"],
+    )
     def test_get_historical_data_returns_validated_model(
-        self, nightscout_service, mock_entries_data, mock_treatments_data
+        self,
+        nightscout_service,
+        mock_entries_json,
+        mock_treatments_json,
+        days,
+        entries,
+        treatments,
+        expected_entries,
+        expected_treatments,
     ):
-        """Test that get_historical_data returns validated HistoricalData."""
-        nightscout_service.client.get_historical_data = Mock(
-            return_value=(mock_entries_data, mock_treatments_data)
+        """Test that fetched records are validated and invalid ones skipped."""
+        # None stands for the shared mock payload
+        entries_json = mock_entries_json
+        if entries is not None:
+            entries_json = json.dumps(entries).encode()
+        treatments_json = mock_treatments_json
+        if treatments is not None:
+            treatments_json = json.dumps(treatments).encode()
+        nightscout_service.client.get_historical_data_raw.return_value = (
+            entries_json,
+            treatments_json,
         )
 
-        result = nightscout_service.get_historical_data(days=7)
+        result = nightscout_service.get_historical_data(days=days)
 
+        nightscout_service.client.get_historical_data_raw.assert_called_once_with(
+            days, end_date=result.end_date
+        )
         assert isinstance(result, HistoricalData)
+        assert len(result.entries) == expected_entries
+        assert len(result.treatments) == expected_treatments
+        assert result.entries[0].sgv == 120
+
+    def test_get_historical_data_date_range(self, nightscout_service):
+        """Test that the stored range is the UTC window passed to the client."""
+        nightscout_service.client.get_historical_data_raw.return_value = (
+            b"[]",
+            b"[]",
+        )
+
+        result = nightscout_service.get_historical_data(days=7)
+
+        end_date = nightscout_service.client.get_historical_data_raw.call_args.kwargs[
+            "end_date"
+        ]
+        assert result.end_date == end_date
+        assert result.end_date.tzinfo is UTC
+        assert result.end_date - result.start_date == timedelta(days=7)
+        assert result.end_date_ms - result.start_date_ms == 7 * 24 * 60 * 60 * 1000
+
+        # The millisecond values follow changes to the dates
+        result.end_date = result.start_date
+        assert result.end_date_ms == result.start_date_ms
+
+    def test_get_historical_data_exposes_entry_columns(
+        self, nightscout_service, mock_entries_json
+    ):
+        """Test the columnar views of the entries."""
+        nightscout_service.client.get_historical_data_raw = _const(
+            (mock_entries_json, b"[]")
+        )
+
+        result = nightscout_service.get_historical_data()
+
+        assert result.sgv_values.tolist() == [120, 130]
+        assert result.entry_dates.tolist() == [1704067200000, 1704070800000]
+
+        # The columns follow changes to the entries
+        updated = result.model_copy(update={"entries": result.entries[:1]})
+        assert updated.sgv_values.tolist() == [120]
+        assert updated.entry_dates.tolist() == [1704067200000]
+
+    def test_get_historical_data_all_invalid_entries(self, nightscout_service):
+        """Test that a response with only invalid entries yields no entries."""
+        entries = [{"invalid": "data"}, {"sgv": "high"}]
+        nightscout_service.client.get_historical_data_raw = _const(
+            (json.dumps(entries).encode(), b"[]")
+        )
+
+        result = nightscout_service.get_historical_data()
+
+        assert result.entries == []
+
+    def test_get_historical_data_skips_invalid_treatments(
+        self, nightscout_service, mock_entries_json, mock_treatments_data
+    ):
+        """Test that invalid treatments are skipped without dropping valid ones."""
+        treatments = mock_treatments_data + [{"carbs": 20.0}]
+        nightscout_service.client.get_historical_data_raw = _const(
+            (
+                mock_entries_json,
+                json.dumps(treatments).encode(),
+            )
+        )
+
+        result = nightscout_service.get_historical_data()
+
         assert len(result.entries) == 2
         assert len(result.treatments) == 1
-        assert result.entries[0].sgv == 120
+        assert result.treatments[0].eventType == "Meal Bolus"
 
-    def test_get_historical_data_skips_invalid_entries(self, nightscout_service):
-        """Test that invalid entries are skipped with warning."""
-        valid_entry = {
-            "_id": "entry1",
-            "sgv": 120,
-            "date": 1704067200000,
-            "dateString": "2024-01-01T00:00:00Z",
-            "type": "sgv",
-        }
-        invalid_entry = {"invalid": "data"}
-
-        nightscout_service.client.get_historical_data = Mock(
-            return_value=([valid_entry, invalid_entry], [])
+    def test_get_historical_data_logs_each_invalid_record_once(
+        self, nightscout_service, mock_entries_data, caplog
+    ):
+        """Test that a record with several errors is skipped with one warning."""
+        entries = [{"sgv": -1, "type": 5}] + mock_entries_data
+        nightscout_service.client.get_historical_data_raw = _const(
+            (json.dumps(entries).encode(), b"[]")
         )
 
         result = nightscout_service.get_historical_data()
 
-        # Only valid entry should be included
-        assert len(result.entries) == 1
-        assert result.entries[0].sgv == 120
+        assert [entry.sgv for entry in result.entries] == [120, 130]
+        warnings = [r for r in caplog.records if r.levelname == "WARNING"]
+        assert len(warnings) == 1
+        assert "index 0" in warnings[0].getMessage()
 
-    def test_get_historical_data_with_custom_days(
-        self, nightscout_service, mock_entries_data, mock_treatments_data
+    def test_get_historical_data_non_list_raises_validation_error(
+        self, nightscout_service
     ):
-        """Test get_historical_data with custom number of days."""
-        nightscout_service.client.get_historical_data = Mock(
-            return_value=(mock_entries_data, mock_treatments_data)
+        """Test that a response that is not a list is rejected."""
+        nightscout_service.client.get_historical_data_raw = _const(
+            (b'{"status": 401}', b"[]")
         )
 
-        result = nightscout_service.get_historical_data(days=14)
+        with pytest.raises(ValidationError):
+            nightscout_service.get_historical_data()
+
 
-        nightscout_service.client.get_historical_data.assert_called_once_with(14)
+class TestNightscoutServiceGetHistoricalDataAsync:
+    """Tests for get_historical_data_async method."""
+
+    @pytest.mark.asyncio
+    async def test_get_historical_data_async_returns_validated_model(
+        self, nightscout_service, mock_entries_json, mock_treatments_json
+    ):
+        """Test that the async variant awaits the client and validates data."""
+        fetch = AsyncMock(return_value=(mock_entries_json, mock_treatments_json))
+        nightscout_service.client.get_historical_data_raw_async = fetch
+
+        result = await nightscout_service.get_historical_data_async(days=3)
+
+        fetch.assert_awaited_once_with(3, end_date=result.end_date)
         assert isinstance(result, HistoricalData)
+        assert len(result.entries) == 2
+        assert len(result.treatments) == 1
 
 
 class TestNightscoutServiceSyncProfile:
     """Tests for sync_profile method."""
 
-    def test_sync_profile_converts_to_dict(self, nightscout_service, mock_profile_data):
-        """Test that sync_profile converts ProfileStore to dict."""
-        nightscout_service.client.update_profile = Mock()
-
-        profile_store = ProfileStore(**mock_profile_data["store"]["Default"])
-
-        nightscout_service.sync_profile(profile_store, "Default")
+    def test_sync_profile_serializes_to_json(
+        self, nightscout_service, mock_store_data, mock_profile_store
+    ):
+        """Test that sync_profile sends the ProfileStore as JSON bytes."""
+        nightscout_service.sync_profile(mock_profile_store, "Default")
 
-        # Verify update_profile was called with dict
-        call_args = nightscout_service.client.update_profile.call_args
-        assert isinstance(call_args[0][0], dict)
+        # Verify update_profile_raw was called with the serialized store entry
+        call_args = nightscout_service.client.update_profile_raw.call_args
+        assert isinstance(call_args[0][0], bytes)
+        assert json.loads(call_args[0][0]) == mock_store_data
         assert call_args[0][1] == "Default"
 
-    def test_sync_profile_without_name(self, nightscout_service, mock_profile_data):
+    def test_sync_profile_without_name(self, nightscout_service, mock_profile_store):
         """Test sync_profile without specifying profile name."""
-        nightscout_service.client.update_profile = Mock()
-
-        profile_store = ProfileStore(**mock_profile_data["store"]["Default"])
-
-        nightscout_service.sync_profile(profile_store)
+        nightscout_service.sync_profile(mock_profile_store)
 
-        # Verify update_profile was called with None as profile name
-        call_args = nightscout_service.client.update_profile.call_args
+        # Verify update_profile_raw was called with None as profile name
+        call_args = nightscout_service.client.update_profile_raw.call_args
         assert call_args[0][1] is None